@@ -1,19 +1,49 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, send_from_directory
+from flask import (Flask, render_template, request, jsonify, session, redirect, send_from_directory,
+                   Response, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
-from openai import OpenAI
-from datetime import datetime
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from datetime import datetime, timedelta
 from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, OrderedDict, deque
 import os
-import requests as http_requests
-import stripe
-import smtplib
+import json
+import re
+import math
+import heapq
+import time
+import random
 import secrets
+import hashlib
+import threading
 import base64
 import mimetypes
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import importlib
+import sys
 from werkzeug.utils import secure_filename
-from knowledge_base import CAREER_CLARITY_COACHING_METHODOLOGY
+from knowledge_base import (CAREER_CLARITY_COACHING_METHODOLOGY, METHODOLOGY_SECTIONS,
+                            render_methodology, select_sections)
+
+# openai, stripe and requests are imported on first use (see timed_import), not here:
+# most processes never touch some of them, and every worker pays for what's imported at boot.
+# benchmarks/bench_startup.py fails if one of them creeps back into the import path.
+_boot_started = time.perf_counter()
+BOOT_REPORT   = {}
+
+
+def timed_import(module):
+    """Import a module deferred from boot, logging what the first import cost."""
+    first = module not in sys.modules
+    start = time.perf_counter()
+    imported = importlib.import_module(module)   # takes the import lock, so threads can race here
+    if first:
+        elapsed = round((time.perf_counter() - start) * 1000, 1)
+        BOOT_REPORT.setdefault('deferred_imports_ms', {})[module] = elapsed
+        print(f"[BOOT] deferred import of {module} took {elapsed}ms")
+    return imported
+
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'change-this-in-production-please')
@@ -41,11 +71,69 @@ database_url = os.environ.get('DATABASE_URL', 'sqlite:///t2t.db')
 if database_url.startswith('postgres://'):
     database_url = database_url.replace('postgres://', 'postgresql://', 1)
 
+# Connections are pooled per worker process, and all workers together share DB_MAX_CONNECTIONS
+# (kept under Railway's default max_connections of 100, with room for migrations and psql).
+# Each worker gets an equal share; a sync worker needs no more than 5 (one request plus the
+# background queue threads), a gevent worker uses its whole share. gunicorn.conf.py exports
+# the worker count as WEB_CONCURRENCY before the app is preloaded. Pre-ping and recycle
+# replace connections Railway's proxy dropped while idle, instead of failing the request
+# that happens to check one out.
+DB_WORKER_CLASS     = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')   # as in gunicorn.conf.py
+DB_WORKERS          = int(os.environ.get('WEB_CONCURRENCY', '1'))
+DB_MAX_CONNECTIONS  = int(os.environ.get('DB_MAX_CONNECTIONS', '80'))
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal')
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', '15'))  # seconds a writer waits for the lock
+
+
+def engine_options(url):
+    """SQLAlchemy engine and pool settings for the database at `url`."""
+    if url in ('sqlite://', 'sqlite:///:memory:'):
+        return {}   # a single shared connection; nothing to pool
+    share = DB_MAX_CONNECTIONS // max(DB_WORKERS, 1)
+    if DB_WORKER_CLASS != 'gevent':
+        share = min(share, 5)
+    if share < 2:
+        print(f"[DB] WARNING: {DB_WORKERS} workers leave under 2 connections each out of "
+              f"DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS}; using 2, so the total can exceed it")
+        share = 2
+    pool = {
+        'pool_size':     int(os.environ.get('DB_POOL_SIZE', (share + 1) // 2)),
+        'max_overflow':  int(os.environ.get('DB_MAX_OVERFLOW', share // 2)),
+        'pool_timeout':  int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+    if url.startswith('sqlite'):
+        # The driver's timeout is SQLite's busy timeout: how long a writer waits for the lock
+        return {**pool, 'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT}}
+    return {
+        **pool,
+        'pool_recycle':  int(os.environ.get('DB_POOL_RECYCLE', 300)),
+        'pool_pre_ping': True,
+        'pool_use_lifo': True,   # idle extras age out via pool_recycle instead of all staying warm
+    }
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """WAL lets readers carry on while one connection writes; the rollback journal blocks them.
+    synchronous=NORMAL is safe under WAL (a crash can lose the last commits, not corrupt the file)."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+    if SQLITE_JOURNAL_MODE.lower() == 'wal':
+        cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}')
+    cursor.close()
+
+
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
 
 db = SQLAlchemy(app)
 
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', configure_sqlite_connection)
+    print(f"[DB] {db.engine.dialect.name} engine: {app.config['SQLALCHEMY_ENGINE_OPTIONS']}")
+
 
 # ─────────────────────────────────────────────
 #  MODELS
@@ -93,12 +181,18 @@ class User(db.Model):
 
 class Thread(db.Model):
     __tablename__ = 'threads'
+    __table_args__ = (
+        # Serves the sidebar's keyset pagination: newest-first per user, id as tiebreak
+        db.Index('ix_threads_user_updated', 'user_id', 'updated_at', 'id'),
+    )
     id         = db.Column(db.Integer, primary_key=True)
     user_id    = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     title      = db.Column(db.String(200), nullable=False, default='New Conversation')
     mode       = db.Column(db.String(20), default='chat')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    summary            = db.Column(db.Text)      # rolling summary of turns older than the context window
+    summary_through_id = db.Column(db.Integer)   # id of the newest message folded into `summary`
     messages   = db.relationship(
         'Message', backref='thread', lazy=True,
         cascade='all, delete-orphan',
@@ -120,57 +214,560 @@ class Thread(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Serves the per-turn "newest N messages in this thread" history window
+        db.Index('ix_messages_thread_created', 'thread_id', 'created_at'),
+    )
     id         = db.Column(db.Integer, primary_key=True)
     thread_id  = db.Column(db.Integer, db.ForeignKey('threads.id'), nullable=False)
     role       = db.Column(db.String(20), nullable=False)   # 'user' | 'assistant'
     content    = db.Column(db.Text, nullable=False)
     mode       = db.Column(db.String(20), default='chat')
+    token_count = db.Column(db.Integer)   # filled on insert, see _count_message_tokens
+    # Model usage for assistant replies — cached_tokens / prompt_tokens is the prompt-cache hit rate
+    prompt_tokens     = db.Column(db.Integer)
+    cached_tokens     = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    attachments = db.relationship('MessageAttachment', lazy='selectin', cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
-            'id':         self.id,
-            'role':       self.role,
-            'content':    self.content,
-            'mode':       self.mode,
-            'created_at': self.created_at.isoformat(),
+            'id':          self.id,
+            'role':        self.role,
+            'content':     self.content,
+            'mode':        self.mode,
+            'created_at':  self.created_at.isoformat(),
+            'attachments': [{'file_id': a.upload_id, 'filename': a.upload.filename} for a in self.attachments],
         }
 
 
-# Create tables on startup, and run any needed column migrations
-with app.app_context():
-    db.create_all()
-    # Migration: add has_seen_onboarding if it doesn't exist yet
-    for migration_sql in [
-        'ALTER TABLE users ADD COLUMN has_seen_onboarding BOOLEAN NOT NULL DEFAULT 0',
-        'ALTER TABLE users ADD COLUMN tier INTEGER NOT NULL DEFAULT 0',
-        'ALTER TABLE users ADD COLUMN stripe_customer_id VARCHAR(100)',
-        'ALTER TABLE users ADD COLUMN reset_token VARCHAR(100)',
-        'ALTER TABLE users ADD COLUMN reset_token_expires DATETIME',
-    ]:
+IMAGE_TOKEN_ESTIMATE = 765   # gpt-4o cost of one high-detail 1024px image
+_token_encoder = None
+
+
+def count_tokens(content):
+    """Count model tokens for message content (a string or a vision content array)."""
+    global _token_encoder
+    if isinstance(content, list):
+        return sum(count_tokens(p.get('text', '')) if p.get('type') == 'text' else IMAGE_TOKEN_ESTIMATE
+                   for p in content)
+    if _token_encoder is None:
         try:
-            from sqlalchemy import text
-            with db.engine.connect() as conn:
-                conn.execute(text(migration_sql))
-                conn.commit()
+            import tiktoken
+            _token_encoder = tiktoken.get_encoding('o200k_base')
         except Exception:
-            pass  # Column already exists — safe to ignore
-
-    # Seed admin/test user — survives every redeploy
-    _seed_email = 'christopher@goilx.com'
-    _seed_user = User.query.filter_by(email=_seed_email).first()
-    if not _seed_user:
-        _seed_user = User(
-            name='Christopher Goodsell',
-            email=_seed_email,
-            tier=2
-        )
-        _seed_user.set_password('CharlieDog2025!!!')
-        db.session.add(_seed_user)
-        db.session.commit()
-    elif _seed_user.tier < 2:
-        _seed_user.tier = 2
-        db.session.commit()
+            _token_encoder = False   # tiktoken unavailable — fall back to ~4 chars per token
+    if _token_encoder:
+        return len(_token_encoder.encode(content or '', disallowed_special=()))
+    return len(content or '') // 4 + 1
+
+
+@event.listens_for(Message, 'before_insert')
+def _count_message_tokens(mapper, connection, target):
+    if target.token_count is None:
+        target.token_count = count_tokens(target.content)
+
+
+class StoredFile(db.Model):
+    """One uploaded file per content hash (and PDF page selection), with its extracted text cached."""
+    __tablename__ = 'stored_files'
+    key          = db.Column(db.String(120), primary_key=True)   # sha256, or "sha256:pages" for a page selection
+    sha256       = db.Column(db.String(64), nullable=False, index=True)
+    ext          = db.Column(db.String(10), nullable=False)
+    size_bytes   = db.Column(db.Integer, nullable=False)
+    status       = db.Column(db.String(20), nullable=False, default='pending')   # pending | done | error
+    content      = db.Column(db.Text)        # extracted text (None for images)
+    meta         = db.Column(db.Text)        # JSON extraction report, e.g. PDF pages read vs skipped
+    error        = db.Column(db.Text)
+    hit_count    = db.Column(db.Integer, nullable=False, default=0)
+    created_at   = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)   # LRU eviction order
+    started_at   = db.Column(db.DateTime)    # when the current extraction was submitted
+
+
+class Upload(db.Model):
+    """A user's upload of a stored file. `id` is the file_id / job id handed to the client."""
+    __tablename__ = 'uploads'
+    id         = db.Column(db.String(32), primary_key=True)
+    user_id    = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    stored_key = db.Column(db.String(120), nullable=False, index=True)   # StoredFile.key
+    filename   = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        # Content stays server-side; the client only ever refers to the file by id
+        stored = db.session.get(StoredFile, self.stored_key)
+        return {
+            'job_id':     self.id,
+            'file_id':    self.id,
+            'filename':   self.filename,
+            'status':     stored.status if stored else 'error',
+            'is_image':   bool(stored and stored.ext in IMAGE_EXTENSIONS),
+            'error':      (stored.error if stored else 'This file has expired — please upload it again.'),
+            'extraction': json.loads(stored.meta) if stored and stored.meta else None,
+        }
+
+
+class MessageAttachment(db.Model):
+    """Links a message to the uploads sent with it, so later turns can resend them server-side."""
+    __tablename__ = 'message_attachments'
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), primary_key=True)
+    upload_id  = db.Column(db.String(32), db.ForeignKey('uploads.id'), primary_key=True)
+    upload     = db.relationship('Upload', lazy='joined')
+
+
+class DocumentChunk(db.Model):
+    """A retrieval chunk of a large extracted document, with its term frequencies for BM25."""
+    __tablename__ = 'document_chunks'
+    id         = db.Column(db.Integer, primary_key=True)
+    stored_key = db.Column(db.String(120), nullable=False, index=True)   # StoredFile.key
+    seq        = db.Column(db.Integer, nullable=False)                   # position in the document
+    text       = db.Column(db.Text, nullable=False)
+    length     = db.Column(db.Integer, nullable=False)                   # number of indexed terms
+    terms      = db.Column(db.Text, nullable=False)                      # JSON {term: frequency}
+
+
+class GhlOutbox(db.Model):
+    """A GoHighLevel call waiting to be sent, written in the same transaction as the change behind it."""
+    __tablename__ = 'ghl_outbox'
+    __table_args__ = (
+        # Serves the dispatcher's "due pending rows, oldest first" poll
+        db.Index('ix_ghl_outbox_due', 'status', 'next_attempt_at'),
+    )
+    id              = db.Column(db.Integer, primary_key=True)
+    kind            = db.Column(db.String(30), nullable=False)       # 'create_contact' | 'tag_contact'
+    user_id         = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    payload         = db.Column(db.Text, nullable=False)             # JSON arguments for the call
+    status          = db.Column(db.String(20), nullable=False, default='pending')   # 'pending' | 'done' | 'dead'
+    attempts        = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)   # doubles as the claim lease
+    last_error      = db.Column(db.Text)
+    created_at      = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at    = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id':              self.id,
+            'kind':            self.kind,
+            'user_id':         self.user_id,
+            'payload':         json.loads(self.payload),
+            'status':          self.status,
+            'attempts':        self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat(),
+            'last_error':      self.last_error,
+            'created_at':      self.created_at.isoformat(),
+        }
+
+
+class GhlContactLookup(db.Model):
+    """Whether an email has a GHL contact, as last checked off the request path (see ghl_contact_known)."""
+    __tablename__ = 'ghl_contact_lookups'
+    email      = db.Column(db.String(255), primary_key=True)
+    contact_id = db.Column(db.String(100))   # None = no contact with this email
+    checked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class StripeEvent(db.Model):
+    """A verified Stripe webhook event, stored on receipt and applied by the Stripe worker."""
+    __tablename__ = 'stripe_events'
+    __table_args__ = (
+        db.Index('ix_stripe_events_due', 'status', 'next_attempt_at'),
+    )
+    id              = db.Column(db.Integer, primary_key=True)
+    event_id        = db.Column(db.String(255), unique=True, nullable=False)   # Stripe's evt_… id; dedupes redeliveries
+    type            = db.Column(db.String(100), nullable=False)
+    payload         = db.Column(db.Text, nullable=False)                       # raw event JSON as delivered
+    status          = db.Column(db.String(20), nullable=False, default='pending')   # 'pending' | 'applied' | 'failed'
+    attempts        = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error      = db.Column(db.Text)
+    received_at     = db.Column(db.DateTime, default=datetime.utcnow)
+    applied_at      = db.Column(db.DateTime)
+
+
+class OutgoingEmail(db.Model):
+    """An email waiting for the background sender (see drain_email_queue)."""
+    __tablename__ = 'outgoing_emails'
+    __table_args__ = (
+        db.Index('ix_outgoing_emails_due', 'status', 'next_attempt_at'),
+    )
+    id              = db.Column(db.Integer, primary_key=True)
+    to_email        = db.Column(db.String(255), nullable=False)
+    subject         = db.Column(db.String(255), nullable=False)
+    text_body       = db.Column(db.Text, nullable=False)
+    html_body       = db.Column(db.Text)
+    status          = db.Column(db.String(20), nullable=False, default='pending')   # 'pending' | 'sent' | 'dead'
+    attempts        = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error      = db.Column(db.Text)
+    created_at      = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at         = db.Column(db.DateTime)
+
+
+class CareerOpener(db.Model):
+    """A pre-generated Career Clarity opening message, consumed when a journey starts."""
+    __tablename__ = 'career_openers'
+    id          = db.Column(db.Integer, primary_key=True)
+    prompt_hash = db.Column(db.String(64), nullable=False, index=True)   # hash of the prompt that produced it
+    content     = db.Column(db.Text, nullable=False)
+    created_at  = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class JobLease(db.Model):
+    """A named lease on a periodic job, so one worker process runs it at a time (see acquire_lease)."""
+    __tablename__ = 'job_leases'
+    name       = db.Column(db.String(50), primary_key=True)
+    held_until = db.Column(db.DateTime, nullable=False)
+
+
+class SchemaMigration(db.Model):
+    """One applied schema migration; MAX(version) is the database's schema version."""
+    __tablename__ = 'schema_migrations'
+    version     = db.Column(db.Integer, primary_key=True)
+    name        = db.Column(db.String(200), nullable=False)
+    applied_at  = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_ms = db.Column(db.Float)
+
+
+# ─────────────────────────────────────────────
+#  SCHEMA MIGRATIONS
+# ─────────────────────────────────────────────
+# Schema changes are numbered migrations, each applied once and recorded in
+# schema_migrations, so boot is a single version check when nothing is pending.
+# Append new migrations with the next number; never edit or renumber one that has shipped.
+# Databases from before this registry already have some of these changes, so migrations
+# check for what exists instead of relying on errors.
+
+# Full-text index over message content, maintained by the database itself as rows are
+# inserted, edited or deleted (thread deletes cascade to their messages):
+#   SQLite   — an external-content FTS5 table kept in sync by triggers
+#   Postgres — a generated tsvector column with a GIN index
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='porter unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    # Backfill messages written before the index existed
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_SEARCH_DDL = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED",
+    'CREATE INDEX IF NOT EXISTS ix_messages_search ON messages USING GIN (search_vector)',
+]
+
+# Migration 13 replaces messages_fts with an index scoped per user. Each row carries an
+# owner term ('u<user_id>') that every query ANDs in, so FTS5 only ranks the searcher's own
+# messages instead of every user's matches. The owner isn't a column of messages, so this
+# table keeps its own copy of the content, and deletes need only the rowid. Prefix indexes
+# let the typeahead's last word seek like a whole word rather than merging every term that
+# starts with it, at the cost of a larger index.
+SQLITE_USER_SEARCH_DDL = [
+    'DROP TRIGGER IF EXISTS messages_fts_ai',
+    'DROP TRIGGER IF EXISTS messages_fts_ad',
+    'DROP TRIGGER IF EXISTS messages_fts_au',
+    'DROP TABLE IF EXISTS messages_fts',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_search USING fts5("
+    "content, owner, tokenize='porter unicode61', prefix='2 3 4 5 6 7 8')",
+    """CREATE TRIGGER IF NOT EXISTS messages_search_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_search(rowid, content, owner) VALUES (
+            new.id, new.content, (SELECT 'u' || user_id FROM threads WHERE id = new.thread_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_search_ad AFTER DELETE ON messages BEGIN
+        DELETE FROM messages_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_search_au AFTER UPDATE OF content ON messages BEGIN
+        UPDATE messages_search SET content = new.content WHERE rowid = new.id;
+    END""",
+    """INSERT INTO messages_search(rowid, content, owner)
+        SELECT m.id, m.content, 'u' || t.user_id FROM messages m JOIN threads t ON t.id = m.thread_id
+        WHERE m.id NOT IN (SELECT rowid FROM messages_search)""",
+]
+
+MIGRATION_LOCK_KEY = 727001   # Postgres advisory lock held while migrating, so instances take turns
+SEED_ADMIN_EMAIL   = 'christopher@goilx.com'
+
+
+def _create_tables(conn, *models):
+    for model in models:
+        model.__table__.create(bind=conn, checkfirst=True)
+
+
+def _add_columns(conn, table, columns):
+    """ALTER TABLE … ADD COLUMN for each (name, type) the table doesn't have yet."""
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+
+def _search_index(conn):
+    try:
+        if conn.dialect.name == 'sqlite':
+            for statement in SQLITE_SEARCH_DDL:
+                conn.execute(text(statement))
+        elif conn.dialect.name == 'postgresql':
+            # Savepoint, so a failure here doesn't abort the migration's transaction
+            with conn.begin_nested():
+                for statement in POSTGRES_SEARCH_DDL:
+                    conn.execute(text(statement))
+    except Exception as e:
+        # e.g. SQLite built without FTS5 — /api/search falls back to LIKE
+        print(f"[MIGRATE] Full-text index unavailable on {conn.dialect.name}: {e}")
+
+
+def _user_search_index(conn):
+    # Postgres needs nothing new: search prefilters on the user's thread ids, which
+    # ix_messages_thread_created already serves
+    if conn.dialect.name != 'sqlite':
+        return
+    try:
+        for statement in SQLITE_USER_SEARCH_DDL:
+            conn.execute(text(statement))
+    except Exception as e:
+        print(f"[MIGRATE] Full-text index unavailable on {conn.dialect.name}: {e}")
+
+
+def _seed_admin_user(conn):
+    users = User.__table__
+    if conn.execute(users.select().where(users.c.email == SEED_ADMIN_EMAIL)).first():
+        conn.execute(users.update().where(users.c.email == SEED_ADMIN_EMAIL).values(tier=2))
+        return
+    seed = User(name='Christopher Goodsell', email=SEED_ADMIN_EMAIL, tier=2)
+    seed.set_password('CharlieDog2025!!!')
+    conn.execute(users.insert().values(
+        name=seed.name, email=seed.email, tier=2, password_hash=seed.password_hash,
+        has_seen_onboarding=False, created_at=datetime.utcnow(),
+    ))
+
+
+MIGRATIONS = [
+    (1, 'create users, threads, messages', lambda conn: _create_tables(conn, User, Thread, Message)),
+    (2, 'users: onboarding, tier, stripe and reset columns', lambda conn: _add_columns(conn, 'users', [
+        ('has_seen_onboarding', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+        ('tier',                'INTEGER NOT NULL DEFAULT 0'),
+        ('stripe_customer_id',  'VARCHAR(100)'),
+        ('reset_token',         'VARCHAR(100)'),
+        ('reset_token_expires', 'TIMESTAMP'),
+    ])),
+    (3, 'create uploads, stored files, attachments, document chunks',
+     lambda conn: _create_tables(conn, StoredFile, Upload, MessageAttachment, DocumentChunk)),
+    (4, 'create career openers', lambda conn: _create_tables(conn, CareerOpener)),
+    (5, 'index messages (thread_id, created_at)', lambda conn: conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_messages_thread_created ON messages (thread_id, created_at)'))),
+    (6, 'threads: rolling summary columns', lambda conn: _add_columns(conn, 'threads', [
+        ('summary',            'TEXT'),
+        ('summary_through_id', 'INTEGER'),
+    ])),
+    (7, 'messages: token and usage columns', lambda conn: _add_columns(conn, 'messages', [
+        ('token_count',       'INTEGER'),
+        ('prompt_tokens',     'INTEGER'),
+        ('cached_tokens',     'INTEGER'),
+        ('completion_tokens', 'INTEGER'),
+    ])),
+    (8, 'index threads (user_id, updated_at, id)', lambda conn: conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_threads_user_updated ON threads (user_id, updated_at, id)'))),
+    (9, 'full-text index on messages', _search_index),
+    (10, 'create GHL outbox, Stripe events, outgoing emails',
+     lambda conn: _create_tables(conn, GhlOutbox, StripeEvent, OutgoingEmail)),
+    (11, 'seed admin user', _seed_admin_user),
+    (12, 'stored files: extraction start time', lambda conn: _add_columns(conn, 'stored_files', [
+        ('started_at', 'TIMESTAMP'),
+    ])),
+    (13, 'full-text index scoped per user', _user_search_index),
+    (14, 'create job leases', lambda conn: _create_tables(conn, JobLease)),
+    (15, 'create GHL contact lookups', lambda conn: _create_tables(conn, GhlContactLookup)),
+]
+
+
+def migrate():
+    """Apply pending migrations in order. Returns (schema_version, [(version, name, ms)] applied)."""
+    try:
+        with db.engine.connect() as conn:
+            current = conn.execute(text('SELECT MAX(version) FROM schema_migrations')).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        SchemaMigration.__table__.create(bind=db.engine, checkfirst=True)
+        current = 0
+
+    applied = []
+    for version, name, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+                done = conn.execute(text('SELECT 1 FROM schema_migrations WHERE version = :v'), {'v': version})
+                if done.first():
+                    continue   # another instance applied it while we waited for the lock
+            apply(conn)
+            ms = round((time.perf_counter() - started) * 1000, 1)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow(), duration_ms=ms))
+        print(f"[MIGRATE] v{version} {name} ({ms}ms)")
+        applied.append((version, name, ms))
+    return max(current, MIGRATIONS[-1][0]), applied
+
+
+# Boot timings, reported at the end of this module and by POST /api/admin/schema
+with app.app_context():
+    _migrate_started = time.perf_counter()
+    _schema_version, _applied = migrate()
+    BOOT_REPORT.update({
+        'schema_version':     _schema_version,
+        'migrations_applied': len(_applied),
+        'migrate_ms':         round((time.perf_counter() - _migrate_started) * 1000, 1),
+    })
+    print(f"[BOOT] schema v{_schema_version}: {len(_applied)} migration(s) applied "
+          f"in {BOOT_REPORT['migrate_ms']}ms")
+    # The app is preloaded and then forked: don't let workers inherit the pooled connection
+    # the migration used, or two processes would share one socket
+    db.engine.dispose()
+
+
+# ─────────────────────────────────────────────
+#  INTEGRATION CLIENTS
+# ─────────────────────────────────────────────
+# Outbound HTTP to third-party APIs goes through one IntegrationClient per upstream:
+# a keep-alive connection pool, a timeout per endpoint, a circuit breaker that fails fast
+# after consecutive errors, and latency/error counters (POST /api/admin/integrations).
+# Clients are registered at boot but open their session (and import requests) on first call.
+
+class UpstreamError(Exception):
+    """A call to an upstream got no response: a connection error, a timeout, or an open breaker."""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class IntegrationClient:
+    LATENCY_SAMPLES = 200   # recent calls kept per endpoint for percentiles
+
+    def __init__(self, name, base_url, timeouts=None, default_timeout=(3.05, 10),
+                 failure_threshold=5, reset_seconds=30, pool_size=10):
+        self.name              = name
+        self.base_url          = base_url.rstrip('/')
+        self.timeouts          = timeouts or {}        # endpoint -> (connect, read) seconds
+        self.default_timeout   = default_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_seconds     = reset_seconds
+        self.pool_size         = pool_size
+        self.session           = None                  # created by _session() on first call
+
+        self._lock      = threading.Lock()
+        self._state     = 'closed'   # 'closed' | 'open' | 'half_open'
+        self._failures  = 0
+        self._opened_at = 0.0
+        self._metrics   = {}
+
+    # ── circuit breaker ──
+    def is_open(self):
+        with self._lock:
+            return self._state == 'open' and time.monotonic() - self._opened_at < self.reset_seconds
+
+    def _admit(self, endpoint):
+        with self._lock:
+            if self._state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    self._endpoint(endpoint)['rejected'] += 1
+                    raise CircuitOpenError(f'{self.name} circuit open')
+                self._state = 'half_open'   # let this one call through as a probe
+            elif self._state == 'half_open':
+                self._endpoint(endpoint)['rejected'] += 1
+                raise CircuitOpenError(f'{self.name} circuit half-open, probe in flight')
+
+    def _record(self, endpoint, elapsed_ms, ok):
+        with self._lock:
+            m = self._endpoint(endpoint)
+            m['calls'] += 1
+            m['latencies'].append(elapsed_ms)
+            if ok:
+                self._failures = 0
+                if self._state != 'closed':
+                    print(f"[INTEGRATION] {self.name} circuit closed")
+                self._state = 'closed'
+                return
+            m['errors'] += 1
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    print(f"[INTEGRATION] {self.name} circuit opened after {self._failures} consecutive failures")
+                self._state     = 'open'
+                self._opened_at = time.monotonic()
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self._metrics:
+            self._metrics[endpoint] = {'calls': 0, 'errors': 0, 'rejected': 0,
+                                       'latencies': deque(maxlen=self.LATENCY_SAMPLES)}
+        return self._metrics[endpoint]
+
+    # ── calls ──
+    def _session(self):
+        if self.session is None:
+            requests = timed_import('requests')
+            with self._lock:
+                if self.session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                                            max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self.session = session
+        return self.session
+
+    def request(self, method, path, endpoint=None, **kwargs):
+        """Send a request over the pooled session. Raises CircuitOpenError without calling
+        when the breaker is open, and UpstreamError for transport errors; those, 5xx and 429
+        count toward opening it."""
+        endpoint = endpoint or path
+        session  = self._session()
+        self._admit(endpoint)
+        kwargs.setdefault('timeout', self.timeouts.get(endpoint, self.default_timeout))
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, f'{self.base_url}{path}', **kwargs)
+        except Exception as e:
+            self._record(endpoint, (time.perf_counter() - start) * 1000, ok=False)
+            if isinstance(e, sys.modules['requests'].RequestException):
+                raise UpstreamError(f'{self.name} {endpoint}: {e}') from e
+            raise
+        ok = resp.status_code < 500 and resp.status_code != 429
+        self._record(endpoint, (time.perf_counter() - start) * 1000, ok)
+        return resp
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, m in self._metrics.items():
+                lat = sorted(m['latencies'])
+                endpoints[endpoint] = {
+                    'calls':    m['calls'],
+                    'errors':   m['errors'],
+                    'rejected': m['rejected'],
+                    'p50_ms':   round(lat[len(lat) // 2], 1) if lat else None,
+                    'p95_ms':   round(lat[int(len(lat) * 0.95)], 1) if lat else None,
+                }
+            return {'state': self._state, 'consecutive_failures': self._failures, 'endpoints': endpoints}
+
+
+INTEGRATIONS = {}
+
+
+def integration_client(name, base_url, **options):
+    """Create and register the shared client for an upstream."""
+    INTEGRATIONS[name] = IntegrationClient(name, base_url, **options)
+    return INTEGRATIONS[name]
 
 
 # ─────────────────────────────────────────────
@@ -178,7 +775,21 @@ with app.app_context():
 # ─────────────────────────────────────────────
 GHL_API_KEY     = os.environ.get('GHL_API_KEY', '')
 GHL_LOCATION_ID = os.environ.get('GHL_LOCATION_ID', '')
-GHL_BASE        = 'https://services.leadconnectorhq.com'
+GHL_BASE        = os.environ.get('GHL_BASE_URL', 'https://services.leadconnectorhq.com')   # tools/fake_ghl.py locally
+
+ghl_client = integration_client('ghl', GHL_BASE, timeouts={
+    'contacts.search': (3.05, 5),
+    'contacts.create': (3.05, 10),
+    'contacts.tags':   (3.05, 5),
+})
+
+
+class GhlError(Exception):
+    """A GHL call failed. `retryable` is False for client errors that will fail again as-is."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
 
 
 def ghl_headers():
@@ -189,57 +800,291 @@ def ghl_headers():
     }
 
 
-def find_ghl_contact_by_email(email):
-    """Search GHL for a contact by email. Returns contact dict or None."""
+def _ghl_call(method, path, endpoint, **kwargs):
+    """Make a GHL API call and return the response, raising GhlError unless it is a 2xx."""
     try:
-        resp = http_requests.get(
-            f'{GHL_BASE}/contacts/search',
-            headers=ghl_headers(),
-            params={'query': email, 'locationId': GHL_LOCATION_ID},
-            timeout=10,
-        )
-        if resp.status_code == 200:
-            data = resp.json()
-            contacts = data.get('contacts', [])
-            # Find exact email match
-            for c in contacts:
-                if c.get('email', '').lower() == email.lower():
-                    return c
-        return None
-    except Exception:
-        return None
+        resp = ghl_client.request(method, path, endpoint, headers=ghl_headers(), **kwargs)
+    except UpstreamError as e:
+        raise GhlError(f'{method} {path}: {e}') from e
+    if not 200 <= resp.status_code < 300:
+        retryable = resp.status_code == 429 or resp.status_code >= 500
+        raise GhlError(f'{method} {path}: HTTP {resp.status_code} {resp.text[:200]}', retryable)
+    return resp
+
+
+def find_ghl_contact_by_email(email):
+    """Search GHL for a contact by email. Returns contact dict or None; raises GhlError on failure."""
+    resp = _ghl_call('GET', '/contacts/search', 'contacts.search', params={'query': email, 'locationId': GHL_LOCATION_ID})
+    # Find exact email match
+    for c in resp.json().get('contacts', []):
+        if (c.get('email') or '').lower() == email.lower():
+            return c
+    return None
 
 
 def create_ghl_contact(name, email, phone):
-    """Create a new contact in GHL. Returns contact dict or None."""
+    """Create a new contact in GHL. Returns contact dict; raises GhlError on failure."""
+    first_name = name.split()[0] if name else ''
+    last_name  = ' '.join(name.split()[1:]) if len(name.split()) > 1 else ''
+    payload = {
+        'firstName':  first_name,
+        'lastName':   last_name,
+        'email':      email,
+        'phone':      phone or '',
+        'locationId': GHL_LOCATION_ID,
+    }
+    data = _ghl_call('POST', '/contacts/', 'contacts.create', json=payload).json()
+    return data.get('contact', data)
+
+
+def add_ghl_contact_tags(contact_id, tags):
+    """Add tags to a GHL contact; raises GhlError on failure."""
+    _ghl_call('POST', f'/contacts/{contact_id}/tags', 'contacts.tags', json={'tags': list(tags)})
+
+
+# ─────────────────────────────────────────────
+#  BACKGROUND QUEUES
+# ─────────────────────────────────────────────
+# Shared plumbing for the database-backed work queues (GHL outbox, Stripe events). A queue
+# table has `status`, `attempts`, `next_attempt_at` and `last_error` columns; each worker
+# process runs one draining thread per queue, woken right after a commit that adds work.
+
+QUEUE_BACKOFF_BASE = 15     # seconds before the first retry; doubles per attempt
+QUEUE_BACKOFF_MAX  = 3600
+
+_worker_pids       = {}     # queue name -> pid whose thread is draining it
+_worker_start_lock = threading.Lock()
+
+
+def claim_due_rows(model, limit, lease_seconds):
+    """Take up to `limit` due pending rows, leasing each so concurrent workers skip it."""
+    now   = datetime.utcnow()
+    lease = now + timedelta(seconds=lease_seconds)
+    due = (db.session.query(model.id, model.next_attempt_at)
+           .filter(model.status == 'pending', model.next_attempt_at <= now)
+           .order_by(model.id)
+           .limit(limit)
+           .all())
+    claimed = []
+    for row_id, due_at in due:
+        # Compare-and-set on next_attempt_at: only one worker's update can match
+        won = (model.query
+               .filter(model.id == row_id, model.status == 'pending', model.next_attempt_at == due_at)
+               .update({'next_attempt_at': lease}, synchronize_session=False))
+        if won:
+            claimed.append(row_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return model.query.filter(model.id.in_(claimed)).order_by(model.id).all()
+
+
+def acquire_lease(name, lease_seconds):
+    """Take the named job lease if no other worker holds it. True if this caller now holds it."""
+    now   = datetime.utcnow()
+    lease = now + timedelta(seconds=lease_seconds)
+    # Compare-and-set on held_until: only one worker's update can match an expired lease
+    won = (JobLease.query
+           .filter(JobLease.name == name, JobLease.held_until <= now)
+           .update({'held_until': lease}, synchronize_session=False))
+    if not won and not db.session.get(JobLease, name):
+        db.session.add(JobLease(name=name, held_until=lease))
+        won = 1
     try:
-        first_name = name.split()[0] if name else ''
-        last_name  = ' '.join(name.split()[1:]) if len(name.split()) > 1 else ''
-        payload = {
-            'firstName':  first_name,
-            'lastName':   last_name,
-            'email':      email,
-            'phone':      phone or '',
-            'locationId': GHL_LOCATION_ID,
-        }
-        resp = http_requests.post(
-            f'{GHL_BASE}/contacts/',
-            headers=ghl_headers(),
-            json=payload,
-            timeout=10,
-        )
-        if resp.status_code in (200, 201):
-            data = resp.json()
-            return data.get('contact', data)
-        return None
-    except Exception:
-        return None
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()   # another worker created the lease first
+        return False
+    return bool(won)
+
+
+def release_lease(name):
+    JobLease.query.filter_by(name=name).update({'held_until': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+
+
+def retry_or_dead_letter(row, error, max_attempts, dead_status, label, retryable=True):
+    """Count a failed attempt: schedule a jittered exponential-backoff retry, or give up."""
+    row.attempts  += 1
+    row.last_error = str(error)[:1000]
+    if not retryable or row.attempts >= max_attempts:
+        row.status = dead_status
+        print(f"[{label}] gave up on #{row.id} after {row.attempts} attempts: {error}")
+    else:
+        delay = min(QUEUE_BACKOFF_BASE * 2 ** (row.attempts - 1), QUEUE_BACKOFF_MAX)
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _drain_loop(label, wakeup, drain, batch_size, poll_seconds):
+    while True:
+        wakeup.wait(poll_seconds)
+        wakeup.clear()
+        with app.app_context():
+            try:
+                while drain() == batch_size:
+                    pass
+            except Exception as e:
+                db.session.rollback()
+                print(f"[{label}] worker error: {e}")
+
+
+def start_queue_worker(name, label, wakeup, drain, batch_size, poll_seconds):
+    """Start a queue's draining thread once per process, since threads don't survive fork."""
+    if _worker_pids.get(name) == os.getpid():
+        return
+    with _worker_start_lock:
+        if _worker_pids.get(name) == os.getpid():
+            return
+        _worker_pids[name] = os.getpid()
+        threading.Thread(target=_drain_loop, args=(label, wakeup, drain, batch_size, poll_seconds),
+                         daemon=True, name=name).start()
+
+
+@app.before_request
+def start_background_workers():
+    start_ghl_outbox()
+    start_stripe_worker()
+    start_email_sender()
+
+
+# ─────────────────────────────────────────────
+#  GHL OUTBOX
+# ─────────────────────────────────────────────
+# Request handlers never call GHL directly. They add a GhlOutbox row in the same
+# transaction as the user change (enqueue_ghl), and a dispatcher thread in each worker
+# drains due rows in batches — retrying failures with exponential backoff and
+# dead-lettering rows that keep failing. POST /api/admin/ghl-outbox inspects and requeues.
+
+OUTBOX_BATCH_SIZE    = 20
+OUTBOX_POLL_SECONDS  = 5
+OUTBOX_LEASE_SECONDS = 120   # a claimed row is hidden from other workers for this long
+OUTBOX_MAX_ATTEMPTS  = 8
+
+_outbox_wakeup = threading.Event()
+
+
+def enqueue_ghl(kind, user_id, **payload):
+    """Queue a GHL call in the current transaction. Call wake_ghl_outbox() after committing."""
+    db.session.add(GhlOutbox(kind=kind, user_id=user_id, payload=json.dumps(payload)))
+
+
+def wake_ghl_outbox():
+    """Have this worker's dispatcher look for due rows now rather than at its next poll."""
+    _outbox_wakeup.set()
+
+
+def _send_create_contact(rows):
+    """Link the user to their GHL contact, reusing one registered via another channel."""
+    row  = rows[0]
+    user = db.session.get(User, row.user_id)
+    if not user or user.ghl_contact_id:
+        return
+    p = json.loads(row.payload)
+    contact = find_ghl_contact_by_email(p['email']) or create_ghl_contact(p['name'], p['email'], p.get('phone'))
+    user.ghl_contact_id = contact.get('id')
+
+
+def _send_tags(rows):
+    """Apply every queued tag for one user in a single call."""
+    user = db.session.get(User, rows[0].user_id)
+    if not user:
+        return
+    if not user.ghl_contact_id:
+        creating = GhlOutbox.query.filter_by(user_id=user.id, kind='create_contact', status='pending').first()
+        if creating:
+            raise GhlError('waiting for the contact to be created')
+        print(f"[GHL OUTBOX] user {user.id} has no GHL contact — skipping tags")
+        return
+    add_ghl_contact_tags(user.ghl_contact_id, sorted({json.loads(r.payload)['tag'] for r in rows}))
+
+
+def _run_outbox_rows(rows, send):
+    """Send one logical call covering `rows`, then record success, a retry, or a dead letter."""
+    now = datetime.utcnow()
+    try:
+        send(rows)
+        for row in rows:
+            row.attempts    += 1
+            row.status       = 'done'
+            row.processed_at = now
+            row.last_error   = None
+    except Exception as e:
+        db.session.rollback()
+        for row in rows:
+            retry_or_dead_letter(row, e, OUTBOX_MAX_ATTEMPTS, 'dead', 'GHL OUTBOX',
+                                 retryable=getattr(e, 'retryable', True))
+    db.session.commit()
+
+
+def dispatch_ghl_outbox():
+    """Send one batch of due outbox rows. Returns how many rows were claimed."""
+    if ghl_client.is_open():
+        return 0   # GHL is failing — leave rows pending rather than burn their attempts
+    rows = claim_due_rows(GhlOutbox, OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS)
+    # Contacts first, so tags queued in the same batch find the contact id
+    for row in rows:
+        if row.kind == 'create_contact':
+            _run_outbox_rows([row], _send_create_contact)
+    tags_by_user = {}
+    for row in rows:
+        if row.kind == 'tag_contact':
+            tags_by_user.setdefault(row.user_id, []).append(row)
+    for user_rows in tags_by_user.values():
+        _run_outbox_rows(user_rows, _send_tags)
+    return len(rows)
+
+
+def start_ghl_outbox():
+    if GHL_API_KEY:
+        start_queue_worker('ghl-outbox', 'GHL OUTBOX', _outbox_wakeup, dispatch_ghl_outbox,
+                           OUTBOX_BATCH_SIZE, OUTBOX_POLL_SECONDS)
+
+
+# Login tells an unknown email that belongs to a GHL contact (registered via another
+# channel) to finish signing up. The GHL search runs on a background thread and its result
+# is kept in ghl_contact_lookups, shared by every worker, so login only reads a row.
+
+GHL_LOOKUP_MAX_AGE = 3600   # seconds before a lookup is repeated
+
+_lookups_running = set()    # emails this process is currently looking up
+_lookups_lock    = threading.Lock()
+
+
+def lookup_ghl_contact(email):
+    """Search GHL for `email` and record the result in ghl_contact_lookups."""
+    try:
+        contact = find_ghl_contact_by_email(email)
+    except GhlError as e:
+        print(f"[GHL] contact lookup failed: {e}")
+        return
+    finally:
+        with _lookups_lock:
+            _lookups_running.discard(email)
+    db.session.merge(GhlContactLookup(email=email, contact_id=contact.get('id') if contact else None,
+                                      checked_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def ghl_contact_known(email):
+    """True/False if a recent lookup found a GHL contact for `email`; None if it isn't known
+    yet, in which case a lookup is started in the background."""
+    if not GHL_API_KEY:
+        return False
+    row = db.session.get(GhlContactLookup, email)
+    if row and row.checked_at > datetime.utcnow() - timedelta(seconds=GHL_LOOKUP_MAX_AGE):
+        return row.contact_id is not None
+    with _lookups_lock:
+        if email in _lookups_running:
+            return None
+        _lookups_running.add(email)
+    run_in_background(lookup_ghl_contact, email)
+    return None
 
 
 # ─────────────────────────────────────────────
 #  STRIPE CONFIG
 # ─────────────────────────────────────────────
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY', '')
+STRIPE_SECRET_KEY      = os.environ.get('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET  = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
 
 STRIPE_TIER1_PRICE_ID  = 'price_1T4KkTFgw6IwkGiqFr3e1Hyi'   # $67 one-time
@@ -249,6 +1094,14 @@ STRIPE_TIER2_LINK      = 'https://buy.stripe.com/3cIaEXgpofTwaY3eSG8og01'
 APP_BASE_URL           = os.environ.get('APP_BASE_URL', 'https://web-production-9a5f2.up.railway.app')
 
 
+def stripe_api():
+    """The stripe module, imported and configured on first use (checkout uses payment links,
+    so only webhook signature checks need it)."""
+    stripe = timed_import('stripe')
+    stripe.api_key = STRIPE_SECRET_KEY
+    return stripe
+
+
 # ─────────────────────────────────────────────
 #  EMAIL CONFIG (for password reset)
 # ─────────────────────────────────────────────
@@ -259,18 +1112,39 @@ SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
 SMTP_FROM     = os.environ.get('SMTP_FROM', SMTP_USER)
 
 
+# Without credentials, mail goes to an unauthenticated SMTP_SERVER only if one is set explicitly
+# (e.g. tools/debug_smtp.py); otherwise reset links are printed to the log.
+SMTP_ENABLED = bool(SMTP_USER and SMTP_PASSWORD) or 'SMTP_SERVER' in os.environ
+
+# Emails are queued in outgoing_emails and sent by a background sender that keeps one
+# authenticated SMTP connection open across messages.
+EMAIL_BATCH_SIZE    = 20
+EMAIL_POLL_SECONDS  = 5
+EMAIL_LEASE_SECONDS = 120
+EMAIL_MAX_ATTEMPTS  = 6
+SMTP_IDLE_SECONDS   = 60    # check an idle connection with NOOP before reusing it
+
+_email_wakeup = threading.Event()
+_smtp         = None        # the sender thread's connection; only that thread touches it
+_smtp_used_at = 0.0
+
+
+def enqueue_email(to_email, subject, text_body, html_body=None):
+    """Queue an email in the current transaction. Call wake_email_sender() after committing."""
+    db.session.add(OutgoingEmail(to_email=to_email, subject=subject, text_body=text_body, html_body=html_body))
+
+
+def wake_email_sender():
+    _email_wakeup.set()
+
+
 def send_reset_email(to_email, reset_url):
-    """Send password reset email. Silently fails if SMTP not configured."""
-    if not SMTP_USER or not SMTP_PASSWORD:
+    """Queue the password reset email (or log the link if SMTP isn't configured)."""
+    if not SMTP_ENABLED:
         print(f"[DEV] Password reset URL for {to_email}: {reset_url}")
         return False
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = 'Reset your T2T password'
-        msg['From']    = f'Teacher to Trainer <{SMTP_FROM}>'
-        msg['To']      = to_email
 
-        text_body = f"""Hi,
+    text_body = f"""Hi,
 
 You requested a password reset for your Teacher to Trainer account.
 
@@ -281,7 +1155,7 @@ If you didn't request this, you can safely ignore this email.
 
 — The T2T Team"""
 
-        html_body = f"""<html><body style="font-family:sans-serif;max-width:520px;margin:0 auto;padding:32px;background:#f5f5f5;">
+    html_body = f"""<html><body style="font-family:sans-serif;max-width:520px;margin:0 auto;padding:32px;background:#f5f5f5;">
 <div style="background:#201B57;padding:32px;border-radius:12px;text-align:center;">
   <h2 style="color:#00b4c8;margin-bottom:8px;">Reset Your Password</h2>
   <p style="color:#ccc;margin-bottom:24px;">Click the button below to set a new password. This link expires in 1 hour.</p>
@@ -289,23 +1163,106 @@ If you didn't request this, you can safely ignore this email.
   <p style="color:#888;font-size:12px;margin-top:24px;">If you didn't request this, ignore this email.</p>
 </div></body></html>"""
 
-        msg.attach(MIMEText(text_body, 'plain'))
-        msg.attach(MIMEText(html_body, 'html'))
+    enqueue_email(to_email, 'Reset your T2T password', text_body, html_body)
+    return True
 
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(SMTP_FROM, to_email, msg.as_string())
-        return True
-    except Exception as e:
-        print(f"[EMAIL ERROR] {e}")
-        return False
+
+def smtp_connection():
+    """The sender's SMTP connection, opened (or reopened) and authenticated on demand."""
+    global _smtp, _smtp_used_at
+    import smtplib
+    if _smtp is not None and time.monotonic() - _smtp_used_at > SMTP_IDLE_SECONDS:
+        try:
+            if _smtp.noop()[0] != 250:
+                raise smtplib.SMTPServerDisconnected('NOOP failed')
+        except (smtplib.SMTPException, OSError):
+            close_smtp_connection()
+    if _smtp is None:
+        conn = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=15)
+        conn.ehlo()
+        if SMTP_USER and SMTP_PASSWORD:
+            # Never send credentials in the clear: STARTTLS is required whenever we log in
+            conn.starttls()
+            conn.ehlo()
+            conn.login(SMTP_USER, SMTP_PASSWORD)
+        elif conn.has_extn('starttls'):
+            conn.starttls()
+            conn.ehlo()
+        _smtp = conn
+    _smtp_used_at = time.monotonic()
+    return _smtp
+
+
+def close_smtp_connection():
+    global _smtp
+    import smtplib
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    _smtp = None
+
+
+def _email_message(row):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = row.subject
+    msg['From']    = f'Teacher to Trainer <{SMTP_FROM}>'
+    msg['To']      = row.to_email
+    msg.attach(MIMEText(row.text_body, 'plain'))
+    if row.html_body:
+        msg.attach(MIMEText(row.html_body, 'html'))
+    return msg.as_string()
+
+
+def drain_email_queue():
+    """Send one batch of queued emails over the shared connection. Returns how many were claimed."""
+    import smtplib
+    rows = claim_due_rows(OutgoingEmail, EMAIL_BATCH_SIZE, EMAIL_LEASE_SECONDS)
+    for row in rows:
+        try:
+            smtp_connection().sendmail(SMTP_FROM, row.to_email, _email_message(row))
+            row.status     = 'sent'
+            row.attempts  += 1
+            row.sent_at    = datetime.utcnow()
+            row.last_error = None
+            # Bodies can carry one-time links; nothing needs them once delivered
+            row.text_body  = ''
+            row.html_body  = None
+        except smtplib.SMTPRecipientsRefused as e:
+            retry_or_dead_letter(row, e, EMAIL_MAX_ATTEMPTS, 'dead', 'EMAIL', retryable=False)
+        except Exception as e:
+            if isinstance(e, (smtplib.SMTPException, OSError)):
+                close_smtp_connection()   # reconnect on the next attempt
+            retry_or_dead_letter(row, e, EMAIL_MAX_ATTEMPTS, 'dead', 'EMAIL')
+        db.session.commit()
+    return len(rows)
+
+
+def start_email_sender():
+    if SMTP_ENABLED:
+        start_queue_worker('email-sender', 'EMAIL', _email_wakeup, drain_email_queue,
+                           EMAIL_BATCH_SIZE, EMAIL_POLL_SECONDS)
 
 
 # ─────────────────────────────────────────────
 #  OPENAI CLIENT
 # ─────────────────────────────────────────────
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+_openai_client = None
+_openai_lock   = threading.Lock()
+
+
+def openai_client():
+    """The shared OpenAI client, created (and the openai package imported) on first use."""
+    global _openai_client
+    if _openai_client is None:
+        openai = timed_import('openai')
+        with _openai_lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    return _openai_client
 
 
 # ─────────────────────────────────────────────
@@ -380,13 +1337,15 @@ You are in RESEARCH MODE. You have access to live web search.
 - Combine retrieved information with your expert knowledge
 - Produce a structured, well-evidenced response"""
 
-CAREER_CLARITY_PROMPT = """You are the T2T Career Clarity Coach — a specialised AI guide that takes educators through a powerful 8-question journey to discover how their classroom expertise translates into a rewarding professional training and facilitation career.
+CAREER_PROMPT_HEAD = """You are the T2T Career Clarity Coach — a specialised AI guide that takes educators through a powerful 8-question journey to discover how their classroom expertise translates into a rewarding professional training and facilitation career.
 
 You use the S.K.I.L.L.S. Framework (Spot → Know → Identify → Language → Leverage → Secure), Socratic discovery, and NLP-informed coaching.
 
 Your full coaching methodology — including tone, NLP language techniques, six-phase conversation arc, and the complete skills reframe bank — is defined below. It is your operating system. Follow it in every response.
 
-""" + CAREER_CLARITY_COACHING_METHODOLOGY + """
+"""
+
+CAREER_PROMPT_OPERATIONS = """
 
 ─── OPERATIONAL INSTRUCTIONS ───
 
@@ -560,6 +1519,8 @@ should embody it: Socratic, NLP-informed, reflective before directive.
 - The insight card after Q4 should feel like a revelation, not a compliment.
 - You are the guide. They are the hero. Every response reinforces that."""
 
+CAREER_CLARITY_PROMPT = CAREER_PROMPT_HEAD + CAREER_CLARITY_COACHING_METHODOLOGY + CAREER_PROMPT_OPERATIONS
+
 
 # ─────────────────────────────────────────────
 #  AUTH HELPERS
@@ -574,6 +1535,172 @@ def login_required(f):
     return decorated
 
 
+# ─────────────────────────────────────────────
+#  USER CACHE
+# ─────────────────────────────────────────────
+# Requests read the signed-in user's profile (User.to_dict(): name, email, tier, onboarding)
+# from a TTL cache instead of the users table. Whatever changes those fields calls
+# invalidate_user() after committing. Each worker has its own cache, so another worker may
+# serve a stale profile for up to USER_CACHE_TTL; paywall checks re-read the database before
+# refusing (has_tier), so a user who has just paid is never turned away. Setting
+# USER_CACHE_REDIS_URL (with the redis package installed) shares entries between workers, and
+# invalidation then reaches every worker within USER_CACHE_LOCAL_TTL. Shared entries are
+# tagged with the user's version counter as it was before the profile was loaded;
+# invalidating bumps the counter, so an entry written by a load that raced the change is
+# never served.
+USER_CACHE_TTL         = float(os.environ.get('USER_CACHE_TTL', '30'))
+USER_CACHE_LOCAL_TTL   = 5        # seconds the in-process layer trusts an entry when a shared store is set
+USER_CACHE_MAX         = 10000
+USER_CACHE_REDIS_URL   = os.environ.get('USER_CACHE_REDIS_URL', '')
+USER_CACHE_VERSION_TTL = 86400    # must outlive any entry tagged with an older version
+
+
+class UserCache:
+    def __init__(self, ttl, max_entries, shared_url=''):
+        self.ttl           = ttl
+        self.local_ttl     = min(ttl, USER_CACHE_LOCAL_TTL) if shared_url else ttl
+        self.max_entries   = max_entries
+        self.shared_url    = shared_url
+        self._shared       = None            # redis client, created on first use
+        self._entries      = OrderedDict()   # user_id -> (expires_at, profile dict)
+        self._lock         = threading.Lock()
+        self._invalidations = 0              # a load that raced an invalidation isn't stored
+        self._stats        = Counter()
+
+    # ── shared store ──
+    def _shared_call(self, op, *args):
+        """Run a redis command, or return None if there is no shared store or it fails.
+        The database is always the fallback, so an outage only costs cache hits."""
+        if not self.shared_url:
+            return None
+        try:
+            if self._shared is None:
+                self._shared = timed_import('redis').Redis.from_url(
+                    self.shared_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+            return getattr(self._shared, op)(*args)
+        except ImportError:
+            print("[USER CACHE] USER_CACHE_REDIS_URL is set but redis isn't installed; caching per process")
+            self.shared_url = ''
+            self.local_ttl  = self.ttl
+        except Exception as e:
+            with self._lock:
+                self._stats['shared_errors'] += 1
+            print(f"[USER CACHE] shared store {op} failed: {e}")
+        return None
+
+    @staticmethod
+    def _key(user_id):
+        return f't2t:user:{user_id}'
+
+    @staticmethod
+    def _version_key(user_id):
+        return f't2t:user:{user_id}:version'
+
+    def _shared_get(self, user_id):
+        """(profile or None, version) from the shared store. The version is None when
+        there's no shared store, in which case nothing is written back to it."""
+        found = self._shared_call('mget', [self._key(user_id), self._version_key(user_id)])
+        if not found:
+            return None, None
+        entry, version = found
+        version = int(version or 0)
+        entry   = json.loads(entry) if entry else None
+        if entry and entry.get('version') == version:
+            return entry['profile'], version
+        return None, version
+
+    # ── lookups ──
+    def get(self, user_id, load):
+        """The cached profile for user_id, calling load(user_id) on a miss. None if load finds no user."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return entry[1]
+            generation = self._invalidations
+
+        # The version is read before loading, so if the profile changes while we load,
+        # what we write back is already out of date and readers skip it
+        profile, version = self._shared_get(user_id)
+        shared = profile is not None
+        if not shared:
+            profile = load(user_id)
+            if profile is None:
+                return None
+
+        with self._lock:
+            self._stats['shared_hits' if shared else 'misses'] += 1
+            if self._invalidations != generation:
+                return profile   # changed while we were loading; don't cache what we read
+            self._entries[user_id] = (time.monotonic() + self.local_ttl, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if not shared and version is not None:
+            self._shared_call('setex', self._key(user_id), int(self.ttl),
+                              json.dumps({'version': version, 'profile': profile}))
+        return profile
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.pop(user_id, None)
+        if self._shared_call('incr', self._version_key(user_id)) is not None:
+            self._shared_call('expire', self._version_key(user_id), USER_CACHE_VERSION_TTL)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['shared_hits'] + self._stats['misses']
+            return {
+                'entries':       len(self._entries),
+                'ttl':           self.ttl,
+                'local_ttl':     self.local_ttl,
+                'shared':        bool(self.shared_url),
+                'hits':          self._stats['hits'],
+                'shared_hits':   self._stats['shared_hits'],
+                'misses':        self._stats['misses'],
+                'shared_errors': self._stats['shared_errors'],
+                'hit_rate':      round((lookups - self._stats['misses']) / lookups, 3) if lookups else None,
+            }
+
+
+user_cache = UserCache(USER_CACHE_TTL, USER_CACHE_MAX, USER_CACHE_REDIS_URL)
+
+
+def _load_user_profile(user_id):
+    user = db.session.get(User, user_id)
+    return user.to_dict() if user else None
+
+
+def cached_user(user_id, refresh=False):
+    """The user's profile dict (shared between requests: don't modify it), or None if there's
+    no such user. refresh=True skips the cache and reloads from the database."""
+    if refresh:
+        user_cache.invalidate(user_id)
+    return user_cache.get(user_id, _load_user_profile)
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached profile. Call after committing a change to it."""
+    user_cache.invalidate(user_id)
+
+
+def has_tier(user_id, minimum):
+    """Whether the user is on `minimum` tier or above. A refusal is re-checked against the
+    database, since the upgrade may have been applied by another worker."""
+    user = cached_user(user_id)
+    if user and user['tier'] >= minimum:
+        return True
+    user = cached_user(user_id, refresh=True)
+    return bool(user and user['tier'] >= minimum)
+
+
 def make_thread_title(text):
     """Generate a short title from the first user message."""
     text = text.strip()
@@ -616,20 +1743,18 @@ def signup():
     if existing:
         return jsonify({'error': 'An account with this email already exists. Please log in.'}), 409
 
-    # Create contact in GHL
-    ghl_contact    = create_ghl_contact(name, email, phone)
-    ghl_contact_id = ghl_contact.get('id') if ghl_contact else None
-
-    # Create local user
+    # Create local user; the GHL contact is created by the outbox once this commits
     user = User(
-        email          = email,
-        name           = name,
-        phone          = phone,
-        ghl_contact_id = ghl_contact_id,
+        email = email,
+        name  = name,
+        phone = phone,
     )
     user.set_password(password)
     db.session.add(user)
+    db.session.flush()
+    enqueue_ghl('create_contact', user.id, name=name, email=email, phone=phone)
     db.session.commit()
+    wake_ghl_outbox()
 
     session['user_id'] = user.id
     return jsonify({'success': True, 'user': user.to_dict()}), 201
@@ -648,13 +1773,19 @@ def login():
     user = User.query.filter_by(email=email).first()
 
     if not user:
-        # Check if they exist in GHL (registered via another channel)
-        ghl_contact = find_ghl_contact_by_email(email)
-        if ghl_contact:
+        # Check if they exist in GHL (registered via another channel). The lookup runs in the
+        # background; until it lands the client is told to retry shortly.
+        ghl_known = ghl_contact_known(email)
+        if ghl_known:
             return jsonify({
                 'error':        'Account found — please complete sign-up to set your password.',
                 'needs_signup': True,
             }), 404
+        if ghl_known is None:
+            return jsonify({
+                'error':          'No account found with that email. Please sign up.',
+                'lookup_pending': True,
+            }), 404
         return jsonify({'error': 'No account found with that email. Please sign up.'}), 404
 
     if not user.check_password(password):
@@ -668,10 +1799,11 @@ def login():
 @login_required
 def complete_onboarding():
     user_id = session['user_id']
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id)
     if user:
         user.has_seen_onboarding = True
         db.session.commit()
+        invalidate_user(user_id)
     return jsonify({'success': True})
 
 
@@ -686,16 +1818,15 @@ def me():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'user': None})
-    user = User.query.get(user_id)
+    user = cached_user(user_id)
     if not user:
         session.pop('user_id', None)
         return jsonify({'user': None})
-    return jsonify({'user': user.to_dict()})
+    return jsonify({'user': user})
 
 
 @app.route('/api/auth/forgot-password', methods=['POST'])
 def forgot_password():
-    from datetime import timedelta
     data  = request.json or {}
     email = data.get('email', '').strip().lower()
     if not email:
@@ -707,9 +1838,10 @@ def forgot_password():
         token = secrets.token_urlsafe(32)
         user.reset_token         = token
         user.reset_token_expires = datetime.utcnow() + timedelta(hours=1)
-        db.session.commit()
         reset_url = f"{APP_BASE_URL}/?reset_token={token}"
         send_reset_email(email, reset_url)
+        db.session.commit()   # token and queued email land together
+        wake_email_sender()
 
     return jsonify({'success': True, 'message': 'If that email is registered, a reset link has been sent.'})
 
@@ -733,6 +1865,7 @@ def reset_password():
     user.reset_token         = None
     user.reset_token_expires = None
     db.session.commit()
+    invalidate_user(user.id)
 
     # Log them in automatically
     session['user_id'] = user.id
@@ -743,15 +1876,64 @@ def reset_password():
 #  ROUTES — THREADS
 # ─────────────────────────────────────────────
 
+THREAD_PAGE_DEFAULT  = 50
+THREAD_PAGE_MAX      = 100
+MESSAGE_PAGE_DEFAULT = 30
+MESSAGE_PAGE_MAX     = 100
+
+
+def encode_cursor(stamp, row_id):
+    """Keyset cursor for a (timestamp, id) ordered listing."""
+    return f"{stamp.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor):
+    """Parse a cursor from encode_cursor() into (timestamp, id). Returns None if malformed."""
+    try:
+        stamp, _, row_id = cursor.rpartition('_')
+        return datetime.fromisoformat(stamp), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def page_limit(default, maximum):
+    return min(max(request.args.get('limit', default, type=int), 1), maximum)
+
+
 @app.route('/api/threads', methods=['GET'])
 @login_required
 def list_threads():
+    """One page of the sidebar, newest first.
+
+    Keyset-paginated on (updated_at, id): pass the previous response's next_cursor as
+    ?cursor= to get the following page. Only the columns the sidebar shows are selected.
+    """
     user_id = session['user_id']
-    threads = (Thread.query
-               .filter_by(user_id=user_id)
-               .order_by(Thread.updated_at.desc())
-               .all())
-    return jsonify({'threads': [t.to_dict() for t in threads]})
+    limit   = page_limit(THREAD_PAGE_DEFAULT, THREAD_PAGE_MAX)
+
+    query = (db.session.query(Thread.id, Thread.title, Thread.mode, Thread.updated_at)
+             .filter(Thread.user_id == user_id))
+    cursor = request.args.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        updated_at, thread_id = after
+        query = query.filter(db.or_(
+            Thread.updated_at < updated_at,
+            db.and_(Thread.updated_at == updated_at, Thread.id < thread_id),
+        ))
+    rows = query.order_by(Thread.updated_at.desc(), Thread.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    threads = [
+        {'id': r.id, 'title': r.title, 'mode': r.mode, 'updated_at': r.updated_at.isoformat()}
+        for r in rows
+    ]
+    return jsonify({'threads': threads, 'next_cursor': next_cursor})
 
 
 @app.route('/api/threads', methods=['POST'])
@@ -775,6 +1957,46 @@ def get_thread(thread_id):
     return jsonify({'thread': t.to_dict(include_messages=True)})
 
 
+@app.route('/api/threads/<int:thread_id>/messages', methods=['GET'])
+@login_required
+def list_thread_messages(thread_id):
+    """One page of a thread's messages, newest page first, returned oldest → newest.
+
+    Pass the previous response's `before` as ?before= to get the next older page; it is
+    null once the start of the thread is reached. The first page (no cursor) also carries
+    the thread itself and, for career threads, the current question number.
+    """
+    user_id = session['user_id']
+    t = Thread.query.filter_by(id=thread_id, user_id=user_id).first_or_404()
+    limit = page_limit(MESSAGE_PAGE_DEFAULT, MESSAGE_PAGE_MAX)
+
+    query  = Message.query.filter(Message.thread_id == t.id)
+    cursor = request.args.get('before')
+    if cursor:
+        before = decode_cursor(cursor)
+        if before is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        created_at, message_id = before
+        query = query.filter(db.or_(
+            Message.created_at < created_at,
+            db.and_(Message.created_at == created_at, Message.id < message_id),
+        ))
+    rows = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+
+    older = None
+    if len(rows) > limit:
+        rows  = rows[:limit]
+        older = encode_cursor(rows[-1].created_at, rows[-1].id)
+    result = {'messages': [m.to_dict() for m in reversed(rows)], 'before': older}
+
+    if not cursor:
+        result['thread'] = t.to_dict()
+        if t.mode == 'career':
+            user_msg_count = Message.query.filter_by(thread_id=t.id, role='user').count()
+            result['question_number'] = min(user_msg_count, 8)
+    return jsonify(result)
+
+
 @app.route('/api/threads/<int:thread_id>', methods=['PUT'])
 @login_required
 def rename_thread(thread_id):
@@ -798,6 +2020,174 @@ def delete_thread(thread_id):
     return jsonify({'success': True})
 
 
+# ─────────────────────────────────────────────
+#  ROUTES — SEARCH
+# ─────────────────────────────────────────────
+
+SEARCH_RESULTS_MAX = 20
+SEARCH_MIN_CHARS   = 2
+# Highlight markers around matched terms in snippets. Control characters can't occur in
+# typed text, so the client can HTML-escape the snippet and then swap these for <mark>.
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+SNIPPET_WORDS      = 16
+
+FTS5_SEARCH_SQL = """
+    SELECT m.id, m.thread_id, t.title, m.role, m.created_at,
+           snippet(messages_search, 0, :start, :end, '…', :words) AS snippet,
+           bm25(messages_search, 1.0, 0.0) AS rank
+    FROM messages_search
+    JOIN messages m ON m.id = messages_search.rowid
+    JOIN threads  t ON t.id = m.thread_id
+    WHERE messages_search MATCH :query AND t.user_id = :user_id
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+# Prefilter on the user's thread ids so the planner can AND the thread index with the GIN
+# index, rather than fetching every user's matches. Rank and limit first, then build
+# headlines for just the returned rows (ts_headline is costly).
+TSVECTOR_SEARCH_SQL = """
+    WITH q AS (SELECT websearch_to_tsquery('english', :query) AS query),
+    hits AS (
+        SELECT m.id, ts_rank_cd(m.search_vector, q.query) AS rank
+        FROM messages m, q
+        WHERE m.thread_id = ANY(:thread_ids) AND m.search_vector @@ q.query
+        ORDER BY rank DESC
+        LIMIT :limit
+    )
+    SELECT m.id, m.thread_id, t.title, m.role, m.created_at,
+           ts_headline('english', m.content, q.query, :headline) AS snippet,
+           hits.rank
+    FROM hits
+    JOIN messages m ON m.id = hits.id
+    JOIN threads  t ON t.id = m.thread_id, q
+    ORDER BY hits.rank DESC
+"""
+
+
+def fts5_query(q, user_id):
+    """Turn free text into a safe FTS5 query over one user's messages: every word must
+    match, the last one as a prefix unless it's a single letter."""
+    words = re.findall(r'\w+', q.lower())
+    if not words:
+        return None
+    last  = f'"{words[-1]}"' + ('*' if len(words[-1]) > 1 else '')
+    terms = ' '.join([f'"{w}"' for w in words[:-1]] + [last])
+    return f'owner : "u{int(user_id)}" AND content : ({terms})'
+
+
+def like_pattern(q):
+    """A LIKE pattern matching q as a literal substring; use with escape='\\'."""
+    return '%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def like_snippet(content, q):
+    """Rough snippet for the LIKE fallback: the words around the first occurrence of q."""
+    at = content.lower().find(q.lower())
+    if at < 0:
+        return content[:120]
+    start = max(0, content.rfind(' ', 0, max(0, at - 60)) + 1)
+    end   = content.find(' ', at + len(q) + 60)
+    end   = len(content) if end < 0 else end
+    return (('…' if start else '') + content[start:at] + SNIPPET_START + content[at:at + len(q)]
+            + SNIPPET_END + content[at + len(q):end] + ('…' if end < len(content) else ''))
+
+
+_search_backend = None
+
+
+def search_backend():
+    """'fts5', 'tsvector' or 'like' — whichever full-text index migrations 9 and 13 managed to create."""
+    global _search_backend
+    if _search_backend is None:
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            found = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_search'")).first()
+            _search_backend = 'fts5' if found else 'like'
+        elif dialect == 'postgresql':
+            found = db.session.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'messages' AND column_name = 'search_vector'")).first()
+            _search_backend = 'tsvector' if found else 'like'
+        else:
+            _search_backend = 'like'
+    return _search_backend
+
+
+def search_messages(user_id, q, limit):
+    """Ranked message hits for a user's query, best first."""
+    backend = search_backend()
+    if backend == 'fts5':
+        query = fts5_query(q, user_id)
+        if not query:
+            return []
+        rows = db.session.execute(text(FTS5_SEARCH_SQL), {
+            'query': query, 'user_id': user_id, 'limit': limit,
+            'start': SNIPPET_START, 'end': SNIPPET_END, 'words': SNIPPET_WORDS,
+        }).all()
+    elif backend == 'tsvector':
+        thread_ids = [tid for tid, in db.session.query(Thread.id).filter(Thread.user_id == user_id)]
+        if not thread_ids:
+            return []
+        headline = (f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, '
+                    f'MaxWords={SNIPPET_WORDS * 2}, MinWords={SNIPPET_WORDS}, MaxFragments=1')
+        rows = db.session.execute(text(TSVECTOR_SEARCH_SQL), {
+            'query': q, 'thread_ids': thread_ids, 'limit': limit, 'headline': headline,
+        }).all()
+    else:
+        rows = [
+            (m.id, m.thread_id, title, m.role, m.created_at, like_snippet(m.content, q), None)
+            for m, title in (db.session.query(Message, Thread.title)
+                             .join(Thread, Thread.id == Message.thread_id)
+                             .filter(Thread.user_id == user_id, Message.content.ilike(like_pattern(q), escape='\\'))
+                             .order_by(Message.created_at.desc())
+                             .limit(limit))
+        ]
+    return [
+        {
+            'message_id':   r[0],
+            'thread_id':    r[1],
+            'thread_title': r[2],
+            'role':         r[3],
+            # Raw SQL on SQLite hands back timestamps as "YYYY-MM-DD HH:MM:SS.ffffff" strings
+            'created_at':   (r[4] if isinstance(r[4], datetime) else datetime.fromisoformat(r[4])).isoformat(),
+            'snippet':      r[5],
+            'rank':         r[6],
+        }
+        for r in rows
+    ]
+
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search():
+    """Full-text search over the user's messages, plus threads whose title matches."""
+    user_id = session['user_id']
+    q       = (request.args.get('q') or '').strip()[:200]
+    if len(q) < SEARCH_MIN_CHARS:
+        return jsonify({'query': q, 'threads': [], 'results': []})
+    limit = page_limit(SEARCH_RESULTS_MAX, SEARCH_RESULTS_MAX)
+
+    started = time.perf_counter()
+    threads = (db.session.query(Thread.id, Thread.title, Thread.mode, Thread.updated_at)
+               .filter(Thread.user_id == user_id, Thread.title.ilike(like_pattern(q), escape='\\'))
+               .order_by(Thread.updated_at.desc())
+               .limit(5)
+               .all())
+    results = search_messages(user_id, q, limit)
+    took_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"[SEARCH] {search_backend()}: {len(results)} hits in {took_ms}ms")
+
+    return jsonify({
+        'query':   q,
+        'threads': [{'id': t.id, 'title': t.title, 'mode': t.mode, 'updated_at': t.updated_at.isoformat()}
+                    for t in threads],
+        'results': results,
+        'took_ms': took_ms,
+    })
+
+
 # ─────────────────────────────────────────────
 #  FILE UPLOAD CONFIG
 # ─────────────────────────────────────────────
@@ -806,6 +2196,12 @@ UPLOAD_FOLDER     = os.path.join(os.path.dirname(__file__), 'uploads')
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'png', 'jpg', 'jpeg', 'gif', 'csv', 'xlsx'}
 IMAGE_EXTENSIONS   = {'png', 'jpg', 'jpeg', 'gif'}
 MAX_FILE_SIZE      = 20 * 1024 * 1024  # 20 MB
+MAX_EXTRACT_CHARS  = int(os.environ.get('MAX_EXTRACT_CHARS', '200000'))   # text kept per document (indexed for retrieval)
+PDF_PARSE_SECONDS  = float(os.environ.get('PDF_PARSE_SECONDS', '20'))   # per-document parse budget
+EXTRACTION_TIMEOUT_SECONDS = float(os.environ.get('EXTRACTION_TIMEOUT_SECONDS', '60'))   # hard cap, any file type
+VISION_MAX_SIDE     = 2048   # gpt-4o fits images into a 2048px square...
+VISION_SHORT_SIDE   = 768    # ...then scales the short side to 768px
+VISION_JPEG_QUALITY = 85
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -814,33 +2210,161 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def extract_file_content(filepath, filename):
-    """Extract text content from uploaded file. Returns (content_str, is_image, base64_data)."""
+def vision_tokens(width, height, detail):
+    """gpt-4o image token cost: 85 for low detail, else 85 + 170 per 512px tile after the model's own resize."""
+    if detail == 'low':
+        return 85
+    scale  = min(1.0, VISION_MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale  = min(1.0, VISION_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def preprocess_image(filepath):
+    """Write a compact vision variant of an image next to it and return a report.
+
+    Resizes to the model's effective resolution (nothing above it is ever seen), applies and
+    then strips EXIF/metadata, re-encodes as JPEG (PNG if it has transparency) and picks `detail`.
+    Returns {} if Pillow is not installed, in which case the original is sent as before.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return {}
+
+    original_bytes = os.path.getsize(filepath)
+    with Image.open(filepath) as im:
+        im = ImageOps.exif_transpose(im)   # first frame only for GIFs
+        width, height = im.size
+
+        scale = min(1.0, VISION_MAX_SIDE / max(width, height))
+        scale = min(scale, VISION_SHORT_SIDE / min(width * scale, height * scale) * scale)
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if new_size != im.size:
+            im = im.resize(new_size, Image.LANCZOS)
+
+        # Small images look the same at low detail, for a flat 85 tokens
+        detail = 'low' if max(new_size) <= 512 else 'high'
+
+        stem = os.path.splitext(filepath)[0]
+        if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
+            variant = f"{stem}.vision.png"
+            im.save(variant, 'PNG', optimize=True)
+        else:
+            variant = f"{stem}.vision.jpg"
+            im.convert('RGB').save(variant, 'JPEG', quality=VISION_JPEG_QUALITY, optimize=True, progressive=True)
+
+    meta = {
+        'variant':        os.path.basename(variant),
+        'detail':         detail,
+        'original_size':  [width, height],
+        'variant_size':   list(new_size),
+        'original_bytes': original_bytes,
+        'variant_bytes':  os.path.getsize(variant),
+        'tokens_before':  vision_tokens(width, height, 'high'),
+        'tokens_after':   vision_tokens(*new_size, detail),
+    }
+    print(f"[IMAGE] {os.path.basename(filepath)}: {width}x{height} {original_bytes}B -> "
+          f"{new_size[0]}x{new_size[1]} {meta['variant_bytes']}B, "
+          f"tokens {meta['tokens_before']} -> {meta['tokens_after']} (detail={detail})")
+    return meta
+
+
+def parse_page_selection(spec):
+    """Normalise a page selection like "1-5, 8, 12-" (1-based, inclusive). Raises ValueError if malformed."""
+    ranges = []
+    for part in (spec or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        start = int(first) if first else 1
+        end   = int(last) if last else (None if sep else start)
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"Invalid page range: {part}")
+        ranges.append(f"{start}-{end or ''}" if end != start else str(start))
+    return ','.join(ranges) or None
+
+
+def selected_page_indexes(spec, total):
+    """Yield 0-based page indexes for a normalised selection, in order, without duplicates."""
+    if not spec:
+        yield from range(total)
+        return
+    seen = set()
+    for part in spec.split(','):
+        first, sep, last = part.partition('-')
+        start = int(first)
+        end   = int(last) if last else (total if sep else start)
+        for i in range(start - 1, min(end, total)):
+            if i not in seen:
+                seen.add(i)
+                yield i
+
+
+def extract_pdf_text(filepath, pages=None, max_chars=MAX_EXTRACT_CHARS, time_limit=PDF_PARSE_SECONDS):
+    """Walk PDF pages lazily, stopping once `max_chars` of text or `time_limit` seconds is reached.
+
+    Returns (text, meta) where meta reports pages read versus skipped.
+    """
+    from pypdf import PdfReader
+    started = time.monotonic()
+    reader  = PdfReader(filepath)
+    total   = len(reader.pages)
+    chunks, length, read, timed_out = [], 0, 0, False
+
+    for i in selected_page_indexes(pages, total):
+        if length >= max_chars:
+            break
+        if time.monotonic() - started > time_limit:
+            timed_out = True
+            break
+        text = reader.pages[i].extract_text() or ''
+        chunks.append(text)
+        length += len(text) + 1
+        read   += 1
+
+    return '\n'.join(chunks)[:max_chars], {
+        'pages_total':   total,
+        'pages_read':    read,
+        'pages_skipped': total - read,
+        'pages':         pages,
+        'timed_out':     timed_out,
+        'parse_seconds': round(time.monotonic() - started, 3),
+    }
+
+
+def extract_file_content(filepath, filename, pages=None):
+    """Extract text content from uploaded file. Returns (content_str, is_image, meta).
+
+    `pages` is a normalised page selection (see parse_page_selection) and only applies to PDFs.
+    Images have no content; attachment_payload() builds their data URL when they are sent.
+    """
     ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
 
     if ext in IMAGE_EXTENSIONS:
-        with open(filepath, 'rb') as f:
-            b64 = base64.b64encode(f.read()).decode('utf-8')
-        mime = mimetypes.guess_type(filepath)[0] or 'image/jpeg'
-        return None, True, f"data:{mime};base64,{b64}"
+        # Nothing to extract — prepare the compact vision variant instead
+        try:
+            return None, True, preprocess_image(filepath)
+        except Exception as e:
+            print(f"[IMAGE ERROR] {filename}: {e}")
+            return None, True, {}   # the original is sent unchanged
 
     if ext == 'pdf':
         try:
-            from pypdf import PdfReader
-            reader = PdfReader(filepath)
-            text = '\n'.join(page.extract_text() or '' for page in reader.pages)
-            return text[:15000], False, None
+            text, meta = extract_pdf_text(filepath, pages)
+            return text, False, meta
         except Exception as e:
-            return f"[Could not extract PDF text: {e}]", False, None
+            return f"[Could not extract PDF text: {e}]", False, {}
 
     if ext in ('doc', 'docx'):
         try:
             from docx import Document
             doc = Document(filepath)
             text = '\n'.join(p.text for p in doc.paragraphs)
-            return text[:15000], False, None
+            return text[:MAX_EXTRACT_CHARS], False, {}
         except Exception as e:
-            return f"[Could not extract Word doc text: {e}]", False, None
+            return f"[Could not extract Word doc text: {e}]", False, {}
 
     if ext == 'xlsx':
         try:
@@ -852,16 +2376,163 @@ def extract_file_content(filepath, filename):
                 if i > 200:
                     break
                 rows.append('\t'.join(str(c) if c is not None else '' for c in row))
-            return '\n'.join(rows)[:15000], False, None
+            return '\n'.join(rows)[:MAX_EXTRACT_CHARS], False, {}
         except Exception as e:
-            return f"[Could not extract Excel data: {e}]", False, None
+            return f"[Could not extract Excel data: {e}]", False, {}
 
     # txt, csv — plain text
     try:
         with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
-            return f.read(15000), False, None
+            return f.read(MAX_EXTRACT_CHARS), False, {}
     except Exception as e:
-        return f"[Could not read file: {e}]", False, None
+        return f"[Could not read file: {e}]", False, {}
+
+
+UPLOAD_CACHE_MAX_BYTES = int(os.environ.get('UPLOAD_CACHE_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))   # 2 GB
+upload_cache_stats     = {'hits': 0, 'misses': 0, 'evictions': 0}   # per process
+
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', '2'))
+# A pending extraction older than this is taken to be lost (worker killed or restarted, deploy
+# mid-parse) and is resubmitted by the next upload of those bytes or poll of its status.
+EXTRACTION_STALE_SECONDS = int(os.environ.get('EXTRACTION_STALE_SECONDS', '300'))   # well past EXTRACTION_TIMEOUT_SECONDS
+_extraction_pool = None
+
+
+def stored_file_path(sha256, ext):
+    return os.path.join(UPLOAD_FOLDER, f"{sha256}.{ext}")
+
+
+def image_data_url(filepath):
+    with open(filepath, 'rb') as f:
+        b64 = base64.b64encode(f.read()).decode('utf-8')
+    mime = mimetypes.guess_type(filepath)[0] or 'image/jpeg'
+    return f"data:{mime};base64,{b64}"
+
+
+def save_upload_by_hash(file_storage, ext):
+    """Stream an upload to disk while hashing it; keep one copy per SHA-256. Returns (sha256, size)."""
+    digest   = hashlib.sha256()
+    size     = 0
+    tmp_path = os.path.join(UPLOAD_FOLDER, f".tmp-{secrets.token_hex(8)}")
+    with open(tmp_path, 'wb') as out:
+        for chunk in iter(lambda: file_storage.stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    sha256 = digest.hexdigest()
+    path   = stored_file_path(sha256, ext)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return sha256, size
+
+
+def evict_stored_files(keep_sha256):
+    """Delete least-recently-used cache entries until the cache fits UPLOAD_CACHE_MAX_BYTES.
+
+    The file on disk is removed with the last entry that references it.
+    """
+    total = db.session.query(db.func.coalesce(db.func.sum(StoredFile.size_bytes), 0)).scalar()
+    if total <= UPLOAD_CACHE_MAX_BYTES:
+        return
+    for stored in (StoredFile.query
+                   .filter(db.or_(StoredFile.status != 'pending', stale_extraction_filter()),
+                           StoredFile.sha256 != keep_sha256)
+                   .order_by(StoredFile.last_used_at)
+                   .limit(200)
+                   .all()):
+        if total <= UPLOAD_CACHE_MAX_BYTES:
+            break
+        total -= stored.size_bytes
+        DocumentChunk.query.filter_by(stored_key=stored.key).delete(synchronize_session=False)
+        db.session.delete(stored)
+        db.session.flush()
+        if not StoredFile.query.filter_by(sha256=stored.sha256).count():
+            for path in [stored_file_path(stored.sha256, stored.ext)] + \
+                        [os.path.join(UPLOAD_FOLDER, f"{stored.sha256}.vision.{e}") for e in ('jpg', 'png')]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        upload_cache_stats['evictions'] += 1
+    db.session.commit()
+
+
+def extraction_pool():
+    """Per-process pool for CPU-heavy parsing (pypdf, python-docx, openpyxl), created on first use."""
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS)
+    return _extraction_pool
+
+
+def stale_extraction_filter():
+    """SQL condition for pending extractions that have outlived EXTRACTION_STALE_SECONDS."""
+    cutoff = datetime.utcnow() - timedelta(seconds=EXTRACTION_STALE_SECONDS)
+    return db.and_(StoredFile.status == 'pending',
+                   db.or_(StoredFile.started_at.is_(None), StoredFile.started_at < cutoff))
+
+
+def claim_stale_extraction(stored):
+    """Take over a lost extraction: restart its clock if it is stale. Returns True if this
+    caller won the claim (and should resubmit it); concurrent callers see False."""
+    cutoff = datetime.utcnow() - timedelta(seconds=EXTRACTION_STALE_SECONDS)
+    if not stored or stored.status != 'pending' or (stored.started_at and stored.started_at >= cutoff):
+        return False   # the common case, decided without a write
+    claimed = (StoredFile.query
+               .filter(StoredFile.key == stored.key, stale_extraction_filter())
+               .update({'started_at': datetime.utcnow()}, synchronize_session=False))
+    db.session.commit()
+    return claimed == 1
+
+
+def submit_extraction(stored, filename):
+    """Parse a stored file in the extraction pool; the client polls /api/upload/<job_id>.
+    If the pool can't take the job, the row is marked as failed rather than left pending."""
+    global _extraction_pool
+    key   = stored.key
+    pages = key.partition(':')[2] or None   # see upload_file: "sha256:pages" for a page selection
+    try:
+        future = extraction_pool().submit(extract_and_index, stored_file_path(stored.sha256, stored.ext),
+                                          filename, pages)
+    except Exception as e:
+        _extraction_pool = None   # a broken pool refuses every job; start a fresh one next time
+        print(f"[UPLOAD] could not submit extraction for {key}: {e}")
+        StoredFile.query.filter_by(key=key).update({'status': 'error', 'error': f'Extraction failed to start: {e}'},
+                                                   synchronize_session=False)
+        db.session.commit()
+        return
+    future.add_done_callback(lambda f: _finish_extraction(key, f))
+
+
+def _finish_extraction(key, future):
+    """Cache an extraction result on its stored file. Runs as the future's done-callback."""
+    global _extraction_pool
+    with app.app_context():
+        try:
+            content, _, meta, chunks = future.result()
+            result = {'content': content, 'meta': json.dumps(meta) if meta else None, 'status': 'done'}
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _extraction_pool = None
+            result, chunks = {'error': str(e), 'status': 'error'}, []
+        # Only the first result for a pending row counts: a job that was presumed lost and
+        # resubmitted may still finish, and must not index the document twice
+        if not (StoredFile.query.filter_by(key=key, status='pending')
+                .update(result, synchronize_session=False)):
+            db.session.rollback()
+            return
+        for seq, passage, length, terms in chunks:
+            db.session.add(DocumentChunk(stored_key=key, seq=seq, text=passage, length=length,
+                                         terms=json.dumps(terms)))
+        db.session.commit()
+
+
+def _reuse_stored_file(stored):
+    upload_cache_stats['hits'] += 1
+    stored.hit_count    += 1
+    stored.last_used_at  = datetime.utcnow()
 
 
 @app.route('/api/upload', methods=['POST'])
@@ -876,24 +2547,710 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'success': False, 'error': 'File type not allowed'}), 400
 
-    filename   = secure_filename(file.filename)
-    file_id    = secrets.token_hex(8)
-    saved_name = f"{file_id}_{filename}"
-    filepath   = os.path.join(UPLOAD_FOLDER, saved_name)
-    file.save(filepath)
+    filename = secure_filename(file.filename)
+    ext      = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+    # Optional PDF page selection, e.g. "1-5, 12"
+    pages = None
+    if ext == 'pdf':
+        try:
+            pages = parse_page_selection(request.form.get('pages'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+    sha256, size = save_upload_by_hash(file, ext)
+    key          = f"{sha256}:{pages}" if pages else sha256
+
+    stored = db.session.get(StoredFile, key)
+    if stored and stored.status != 'error':
+        # Seen these bytes before — reuse the cached extraction (or the one already running)
+        _reuse_stored_file(stored)
+        cache_miss = False
+    else:
+        if stored:
+            db.session.delete(stored)   # retry a previously failed extraction
+            db.session.flush()
+        stored = StoredFile(key=key, sha256=sha256, ext=ext, size_bytes=size,
+                            status='pending', started_at=datetime.utcnow())
+        db.session.add(stored)
+        cache_miss = True
+
+    upload = Upload(id=secrets.token_hex(8), user_id=session['user_id'], stored_key=key, filename=filename)
+    db.session.add(upload)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent upload of the same new bytes inserted the row first: share its extraction
+        db.session.rollback()
+        stored = db.session.get(StoredFile, key)
+        if not stored:
+            return jsonify({'success': False, 'error': 'Upload conflicted with another; please retry.'}), 409
+        _reuse_stored_file(stored)
+        upload = Upload(id=secrets.token_hex(8), user_id=session['user_id'], stored_key=key, filename=filename)
+        db.session.add(upload)
+        db.session.commit()
+        cache_miss = False
+
+    if cache_miss:
+        upload_cache_stats['misses'] += 1
+        submit_extraction(stored, filename)
+        evict_stored_files(keep_sha256=sha256)
+    elif claim_stale_extraction(stored):
+        submit_extraction(stored, filename)
+
+    result = upload.to_dict()
+    return jsonify({'success': True, **result}), 202 if result['status'] == 'pending' else 200
 
-    content, is_image, base64_data = extract_file_content(filepath, filename)
 
+@app.route('/api/upload/<job_id>', methods=['GET'])
+@login_required
+def upload_status(job_id):
+    upload = Upload.query.filter_by(id=job_id, user_id=session['user_id']).first_or_404()
+    stored = db.session.get(StoredFile, upload.stored_key)
+    if claim_stale_extraction(stored):
+        submit_extraction(stored, upload.filename)
+    return jsonify({'success': True, **upload.to_dict()})
+
+
+@app.route('/api/admin/upload-cache', methods=['POST'])
+def admin_upload_cache():
+    """Admin endpoint reporting extraction-cache size and this worker's hit/miss counters. Protected by SECRET_KEY."""
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    entries, total = db.session.query(db.func.count(StoredFile.key),
+                                      db.func.coalesce(db.func.sum(StoredFile.size_bytes), 0)).one()
     return jsonify({
-        'success':     True,
-        'file_id':     file_id,
-        'filename':    filename,
-        'is_image':    is_image,
-        'content':     content,
-        'base64_data': base64_data,
+        'entries':    entries,
+        'bytes':      total,
+        'max_bytes':  UPLOAD_CACHE_MAX_BYTES,
+        'total_hits': db.session.query(db.func.coalesce(db.func.sum(StoredFile.hit_count), 0)).scalar(),
+        **upload_cache_stats,
     })
 
 
+def attachment_payload(upload):
+    """Resolve an Upload to the content sent to the model: extracted text, or an image data URL."""
+    stored = db.session.get(StoredFile, upload.stored_key) if upload else None
+    if not stored:
+        return {'filename': upload.filename if upload else 'file',
+                'content': '[This attachment is no longer available — ask the user to upload it again.]'}
+    payload = {'upload_id': upload.id, 'filename': upload.filename}
+    if stored.ext in IMAGE_EXTENSIONS:
+        # Prefer the downscaled variant; fall back to the original if preprocessing hasn't run or failed
+        meta    = json.loads(stored.meta) if stored.meta else {}
+        variant = meta.get('variant') and os.path.join(UPLOAD_FOLDER, meta['variant'])
+        payload['is_image'] = True
+        if variant and os.path.exists(variant):
+            payload['base64_data'] = image_data_url(variant)
+            payload['detail']      = meta.get('detail', 'auto')
+        else:
+            payload['base64_data'] = image_data_url(stored_file_path(stored.sha256, stored.ext))
+    elif stored.status == 'pending':
+        payload['content'] = '[This file is still being processed.]'
+    elif stored.status != 'done':
+        payload['content'] = f"[Could not extract text: {stored.error}]"
+    elif (len(stored.content or '') > RETRIEVAL_MIN_CHARS
+          and db.session.query(DocumentChunk.query.filter_by(stored_key=stored.key).exists()).scalar()):
+        # Large documents are never sent whole — retrieve_excerpts() picks the relevant chunks per turn
+        payload['indexed']    = True
+        payload['stored_key'] = stored.key
+        payload['chars']      = len(stored.content)
+    else:
+        payload['content'] = stored.content
+    return payload
+
+
+def resolve_attachments(user_id, files):
+    """Turn the client's `files` list into attachment payloads, looking file_ids up server-side.
+    Only the user's own uploads are resolved; anything else in the list is ignored, since the
+    payload keys (upload_id, stored_key, ...) are server-internal and must never come from the client."""
+    attachments = []
+    for f in files if isinstance(files, list) else []:
+        if not isinstance(f, dict) or not f.get('file_id'):
+            continue
+        upload = Upload.query.filter_by(id=str(f['file_id']), user_id=user_id).first()
+        if upload:
+            attachments.append(attachment_payload(upload))
+    return attachments
+
+
+def build_user_content(user_message, attachments, excerpts=()):
+    """Combine a user message with its attachments — a string, or a vision content array if there are images.
+
+    Small documents are inlined whole; indexed documents are represented by `excerpts`
+    (see retrieve_excerpts) plus a one-line reference. Turns resent as history pass no
+    excerpts, so their reference line doesn't promise any.
+    """
+    text_context = ''
+    for f in attachments:
+        if f.get('indexed') and excerpts:
+            text_context += f"\n\n[Attached file: {f['filename']} — {f['chars']:,} characters, relevant excerpts below]"
+        elif f.get('indexed'):
+            text_context += f"\n\n[Attached file: {f['filename']} — indexed, {f['chars']:,} characters]"
+        elif not f.get('is_image') and f.get('content'):
+            text_context += f"\n\n[Attached file: {f['filename']}]\n{f['content']}"
+    if excerpts:
+        text_context += '\n\n[Relevant excerpts from attached documents]'
+        for e in excerpts:
+            text_context += f"\n\n[{e['filename']} — part {e['seq'] + 1}]\n{e['text']}"
+
+    if not any(f.get('is_image') for f in attachments):
+        return (user_message + text_context).strip()
+
+    # Vision-compatible content array
+    user_content = []
+    if user_message or text_context:
+        user_content.append({'type': 'text', 'text': (user_message + text_context).strip()})
+    for f in attachments:
+        if f.get('is_image') and f.get('base64_data'):
+            user_content.append({'type': 'image_url',
+                                 'image_url': {'url': f['base64_data'], 'detail': f.get('detail', 'auto')}})
+    return user_content
+
+
+# ─────────────────────────────────────────────
+#  DOCUMENT RETRIEVAL
+# ─────────────────────────────────────────────
+
+RETRIEVAL_MIN_CHARS     = 6000   # documents up to this size are simply inlined
+RETRIEVAL_CHUNK_CHARS   = 1200
+RETRIEVAL_CHUNK_OVERLAP = 200
+RETRIEVAL_TOP_K         = int(os.environ.get('RETRIEVAL_TOP_K', '6'))
+RETRIEVAL_INDEX_CACHE   = 32     # BM25 indexes kept in memory per process
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its itself just me more most my no nor not now of off on once only
+or other our ours out over own same she should so some such than that the their theirs them then there
+these they this those through to too under until up very was we were what when where which while who whom
+why will with would you your yours
+""".split())
+
+_retrieval_indexes = OrderedDict()
+
+
+def tokenize(text):
+    return [t for t in re.findall(r'[a-z0-9]+', (text or '').lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def chunk_text(text, size=RETRIEVAL_CHUNK_CHARS, overlap=RETRIEVAL_CHUNK_OVERLAP):
+    """Split text into overlapping chunks, breaking at line or word boundaries where possible."""
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            cut = text.rfind('\n', start + size // 2, end)
+            if cut == -1:
+                cut = text.rfind(' ', start + size // 2, end)
+            if cut != -1:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def _extraction_timed_out(signum, frame):
+    raise TimeoutError(f'Extraction took longer than {EXTRACTION_TIMEOUT_SECONDS:g}s')
+
+
+def extract_and_index(filepath, filename, pages=None):
+    """Extraction pool task: extract_file_content() plus retrieval chunks for large documents.
+
+    Returns (content, is_image, meta, chunks) where chunks is [(seq, text, length, terms)].
+    Pool tasks run on the worker process's main thread, so a SIGALRM timer caps the whole job
+    (PDF_PARSE_SECONDS is only checked between pages; docx/xlsx parsing has no check of its own).
+    """
+    import signal
+    timed = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if timed:
+        signal.signal(signal.SIGALRM, _extraction_timed_out)
+        signal.setitimer(signal.ITIMER_REAL, EXTRACTION_TIMEOUT_SECONDS)
+    try:
+        content, is_image, meta = extract_file_content(filepath, filename, pages)
+        chunks = []
+        if content and len(content) > RETRIEVAL_MIN_CHARS:
+            for seq, passage in enumerate(chunk_text(content)):
+                terms = Counter(tokenize(passage))
+                chunks.append((seq, passage, sum(terms.values()), dict(terms)))
+        return content, is_image, meta, chunks
+    finally:
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of document chunks."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks   = chunks   # [{'stored_key', 'seq', 'text', 'length', 'terms'}]
+        self.k1, self.b = k1, b
+        self.avgdl    = (sum(c['length'] for c in chunks) / len(chunks)) if chunks else 0
+        self.postings = {}
+        for i, c in enumerate(chunks):
+            for term, tf in c['terms'].items():
+                self.postings.setdefault(term, []).append((i, tf))
+
+    def search(self, query_terms, k):
+        n, scores = len(self.chunks), {}
+        for term in set(query_terms):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for i, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.chunks[i]['length'] / (self.avgdl or 1))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return [self.chunks[i] for i, _ in heapq.nlargest(k, scores.items(), key=lambda s: s[1])]
+
+
+def retrieval_index(stored_keys):
+    """BM25 index over the given documents. Cached, since a content-addressed document never changes."""
+    cache_key = tuple(sorted(stored_keys))
+    if cache_key in _retrieval_indexes:
+        _retrieval_indexes.move_to_end(cache_key)
+        return _retrieval_indexes[cache_key]
+    rows = (db.session.query(DocumentChunk.stored_key, DocumentChunk.seq, DocumentChunk.text,
+                             DocumentChunk.length, DocumentChunk.terms)
+            .filter(DocumentChunk.stored_key.in_(cache_key))
+            .all())
+    index = BM25Index([{'stored_key': r.stored_key, 'seq': r.seq, 'text': r.text,
+                        'length': r.length, 'terms': json.loads(r.terms)} for r in rows])
+    _retrieval_indexes[cache_key] = index
+    while len(_retrieval_indexes) > RETRIEVAL_INDEX_CACHE:
+        _retrieval_indexes.popitem(last=False)
+    return index
+
+
+def retrieve_excerpts(thread_id, query, attachments, k=RETRIEVAL_TOP_K):
+    """Top-k chunks relevant to `query` across the thread's indexed documents and this turn's attachments.
+
+    A newly attached document always contributes its opening chunk so the model knows what it is.
+    Returns [{'filename', 'seq', 'text'}] in document order.
+    """
+    filenames = dict(
+        db.session.query(Upload.stored_key, Upload.filename)
+        .join(MessageAttachment, MessageAttachment.upload_id == Upload.id)
+        .join(Message, Message.id == MessageAttachment.message_id)
+        .filter(Message.thread_id == thread_id)
+        .distinct()
+        .all()
+    )
+    new_keys = [a['stored_key'] for a in attachments if a.get('indexed')]
+    for a in attachments:
+        if a.get('indexed'):
+            filenames[a['stored_key']] = a['filename']
+    if not filenames:
+        return []
+
+    index = retrieval_index(filenames.keys())
+    if not index.chunks:
+        return []
+    hits = index.search(tokenize(query), k)
+    picked = {(c['stored_key'], c['seq']): c for c in hits}
+    for c in index.chunks:
+        if c['stored_key'] in new_keys and c['seq'] == 0:
+            picked.setdefault((c['stored_key'], 0), c)
+
+    order = list(filenames.keys())
+    return [{'filename': filenames[c['stored_key']], 'seq': c['seq'], 'text': c['text']}
+            for c in sorted(picked.values(), key=lambda c: (order.index(c['stored_key']), c['seq']))]
+
+
+# ─────────────────────────────────────────────
+#  CONTEXT WINDOW
+# ─────────────────────────────────────────────
+
+# Token budget for thread history (summary + recent turns + current turn), per mode
+CONTEXT_TOKEN_BUDGETS = {
+    'chat':     6000,
+    'document': 16000,
+    'research': 6000,
+    'career':   12000,
+}
+MAX_HISTORY_SCAN   = 60     # newest messages considered when filling the budget
+MAX_SUMMARY_BATCH  = 40     # messages folded into the summary per update
+SUMMARY_INPUT_CHARS = 2000  # per-message cap when feeding turns to the summariser
+SUMMARY_MODEL      = 'gpt-4o-mini'
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a user and T2T, an AI assistant for training consultants, instructional designers and career mentors.
+
+You will be given the current summary (possibly empty) and the next messages that have scrolled out of the conversation window. Return an updated summary that:
+- Keeps every fact, requirement, decision, name, number and deliverable the user has given or agreed to
+- Keeps the user's own words for anything personal (goals, fears, answers to coaching questions)
+- Notes which documents or outputs T2T has already produced, in one line each
+- Drops pleasantries and repetition
+Write compact bullet points, no more than 300 words. Return only the summary."""
+
+
+def assemble_context(thread, user_content, mode):
+    """Build the message history for a turn within the mode's token budget.
+
+    Returns (past, fold_boundary). `past` is the rolling summary (if any), then the newest
+    stored turns that fit the budget, then the current user turn. `fold_boundary` is the id
+    of the oldest turn kept — older turns not yet in the summary should be folded into it —
+    or None when nothing has fallen out of the window.
+    """
+    budget = CONTEXT_TOKEN_BUDGETS.get(mode, CONTEXT_TOKEN_BUDGETS['chat']) - count_tokens(user_content)
+    if thread.summary:
+        budget -= count_tokens(thread.summary)
+
+    rows = (db.session.query(Message.id, Message.role, Message.content, Message.token_count)
+            .filter(Message.thread_id == thread.id,
+                    Message.id > (thread.summary_through_id or 0))
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(MAX_HISTORY_SCAN)
+            .all())
+
+    kept = []
+    for r in rows:
+        tokens = r.token_count if r.token_count is not None else count_tokens(r.content)
+        if tokens > budget:
+            break
+        budget -= tokens
+        kept.append(r)
+
+    fold_boundary = None
+    if len(kept) < len(rows) or len(rows) == MAX_HISTORY_SCAN:
+        fold_boundary = kept[-1].id if kept else rows[0].id + 1
+
+    # Earlier turns' attachments are resent from the server-side store, never by the client
+    stored_attachments = {}
+    if kept:
+        for link in MessageAttachment.query.filter(MessageAttachment.message_id.in_([r.id for r in kept])):
+            stored_attachments.setdefault(link.message_id, []).append(attachment_payload(link.upload))
+
+    past = []
+    if thread.summary:
+        past.append({'role': 'system', 'content': f"Summary of the earlier conversation in this thread:\n{thread.summary}"})
+    for r in reversed(kept):
+        if r.id in stored_attachments:
+            past.append({'role': r.role, 'content': build_user_content(r.content, stored_attachments[r.id])})
+        else:
+            past.append({'role': r.role, 'content': r.content})
+    past.append({'role': 'user', 'content': user_content})
+    return past, fold_boundary
+
+
+def fold_thread_summary(thread_id, boundary_id):
+    """Fold turns older than `boundary_id` that are not yet summarised into the thread summary.
+    Folds oldest first, at most MAX_SUMMARY_BATCH per call; a longer backlog is picked up
+    by the folds that follow the next turns, so no message is skipped."""
+    thread = db.session.get(Thread, thread_id)
+    if not thread:
+        return
+    previous_summary = thread.summary
+    previous_through = thread.summary_through_id
+
+    rows = (Message.query
+            .filter(Message.thread_id == thread_id,
+                    Message.id > (previous_through or 0),
+                    Message.id < boundary_id)
+            .order_by(Message.id)
+            .limit(MAX_SUMMARY_BATCH)
+            .all())
+    if not rows:
+        return
+    transcript = '\n\n'.join(f"{m.role.upper()}: {m.content[:SUMMARY_INPUT_CHARS]}" for m in rows)
+    through_id = rows[-1].id
+    db.session.close()   # don't hold a connection during the model call
+
+    completion = openai_client().chat.completions.create(
+        model       = SUMMARY_MODEL,
+        messages    = [
+            {'role': 'system', 'content': SUMMARY_PROMPT},
+            {'role': 'user', 'content': f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"},
+        ],
+        max_tokens  = 600,
+        temperature = 0.2,
+    )
+    new_summary = completion.choices[0].message.content
+    usage_counts(completion.usage, 'summary')
+
+    # Only apply if no other worker folded this thread in the meantime
+    (Thread.query
+     .filter_by(id=thread_id, summary_through_id=previous_through)
+     .update({'summary': new_summary, 'summary_through_id': through_id}, synchronize_session=False))
+    db.session.commit()
+
+
+def run_in_background(fn, *args):
+    """Run fn(*args) on a daemon thread (a greenlet under gevent) inside an app context."""
+    def runner():
+        with app.app_context():
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[BACKGROUND ERROR] {fn.__name__}: {e}")
+    threading.Thread(target=runner, daemon=True).start()
+
+
+# ─────────────────────────────────────────────
+#  LLM REQUESTS
+# ─────────────────────────────────────────────
+
+CAREER_Q4_TRIGGER = (
+    'SYSTEM TRIGGER: The user has just answered Question 4. '
+    'You MUST now deliver the Insight Card as defined in the AFTER QUESTION 4 section. '
+    'Do not ask Question 5 yet — deliver the insight card first, then end with Question 5 of 8. '
+    'This is mandatory. Do not skip it.'
+)
+
+CAREER_REPORT_TRIGGER = (
+    'SYSTEM TRIGGER: The user has now answered all 8 questions. '
+    'You MUST produce the complete Career Clarity Report RIGHT NOW. '
+    'START YOUR RESPONSE DIRECTLY with "# 🎯 Your Career Clarity Report" — '
+    'do NOT add any reflection, summary, or preamble before this header. '
+    'No "What I heard is that...", no "Based on our conversation...", '
+    'no opener of any kind. Go straight to the report. '
+    'Use the exact structure: '
+    'What I Heard → 3 Hidden Transferable Skills → LinkedIn Transformation Plan '
+    '(3 headline options, full ~150 word About section in first person, '
+    '10 LinkedIn skills, 3 Featured section ideas) → '
+    '90-Day Career Clarity Roadmap (Week 1-2 Foundations, Week 3-4 Translation, '
+    'Month 2 Application, Month 3 Positioning & Launch — 3-4 specific actions each) → '
+    'Your Single Next Step (one specific action based on their timeline) → '
+    'Upgrade CTA. '
+    'Make every element specific to THIS person — use their exact words throughout. '
+    'This is the $67 deliverable. Make it exceptional.'
+)
+
+
+# Send only the methodology sections relevant to the current question (see knowledge_base.py).
+# Each question gets its own stable prompt, so turns still share a cached prefix within a
+# question number but not across them — set to false to always send the full methodology.
+CAREER_KB_SELECTION = os.environ.get('CAREER_KB_SELECTION', 'true').lower() == 'true'
+
+_career_prompts = {}
+_methodology_tokens = {}
+
+
+def methodology_section_tokens():
+    """Token cost of each knowledge base section, counted once per process."""
+    if not _methodology_tokens:
+        _methodology_tokens.update({s['key']: count_tokens(s['text']) for s in METHODOLOGY_SECTIONS})
+    return _methodology_tokens
+
+
+def career_prompt(question_number=None):
+    """Career system prompt for a question number, with its token cost against the full prompt.
+
+    Returns {'prompt', 'sections', 'tokens', 'full_tokens'}; built once per question number.
+    """
+    if not CAREER_KB_SELECTION:
+        question_number = None
+    entry = _career_prompts.get(question_number)
+    if entry is None:
+        keys   = select_sections(question_number)
+        prompt = CAREER_PROMPT_HEAD + render_methodology(keys) + CAREER_PROMPT_OPERATIONS
+        entry  = {
+            'prompt':      prompt,
+            'sections':    keys,
+            'tokens':      count_tokens(prompt),
+            'full_tokens': count_tokens(CAREER_CLARITY_PROMPT),
+        }
+        _career_prompts[question_number] = entry
+    return entry
+
+
+def static_system_prompt(mode, question_number=None):
+    """The large, identical-for-everyone system prompt for a mode.
+
+    Kept byte-for-byte stable and placed first in every request so the provider's
+    prompt cache can reuse it; anything per-user goes in dynamic_instructions().
+    Career mode varies only by question number, never by user.
+    """
+    if mode == 'career':
+        return career_prompt(question_number)['prompt']
+    if mode == 'research':
+        return SYSTEM_PROMPT + RESEARCH_SUFFIX
+    if mode == 'document':
+        return SYSTEM_PROMPT + DOCUMENT_SUFFIX
+    return SYSTEM_PROMPT
+
+
+def dynamic_instructions(mode, first_name, question_number=None):
+    """Per-user / per-turn instructions, sent after the conversation so they never break the cached prefix."""
+    parts = [f"The user's name is {first_name}. Address them by their first name naturally in conversation."]
+    if mode == 'career':
+        # ── SERVER-SIDE TRIGGER: Insight Card after Q4 ──
+        # When user has answered exactly 4 questions, inject a hard instruction
+        if question_number == 4:
+            parts.append(CAREER_Q4_TRIGGER)
+
+        # ── SERVER-SIDE TRIGGER: Full Report after Q8 ──
+        # When user has answered 8 or more questions, force the report
+        if question_number is not None and question_number >= 8:
+            parts.append(CAREER_REPORT_TRIGGER)
+    return '\n\n'.join(parts)
+
+
+def build_llm_request(mode, first_name, past, question_number=None):
+    """Build the OpenAI call for a chat turn. Returns (api, kwargs) where api is 'chat' or 'responses'.
+
+    Layout is static-first, dynamic-last: [static system prompt] + [summary + history + user turn]
+    + [per-user instructions], so consecutive turns share the longest possible cacheable prefix.
+    """
+    if mode == 'career':
+        kb = career_prompt(question_number)
+        print(f"[KB] question {question_number}: {len(kb['sections'])} sections, "
+              f"{kb['tokens']} prompt tokens (saved {kb['full_tokens'] - kb['tokens']} of {kb['full_tokens']})")
+
+    messages = (
+        [{'role': 'system', 'content': static_system_prompt(mode, question_number)}]
+        + past
+        + [{'role': 'system', 'content': dynamic_instructions(mode, first_name, question_number)}]
+    )
+
+    if mode == 'career':
+        return 'chat', {
+            'model':       'gpt-4o',
+            'messages':    messages,
+            'max_tokens':  4000,
+            'temperature': 0.75,
+        }
+
+    if mode == 'research':
+        return 'responses', {
+            'model': 'gpt-4o',
+            'tools': [{'type': 'web_search_preview'}],
+            'input': messages,
+        }
+
+    return 'chat', {
+        'model':       'gpt-4o',
+        'messages':    messages,
+        'max_tokens':  4096 if mode == 'document' else 2048,
+        'temperature': 0.7,
+    }
+
+
+def usage_counts(usage, label='chat'):
+    """Normalise a Chat Completions or Responses usage object and log the prompt-cache hit."""
+    if usage is None:
+        return {}
+    prompt = getattr(usage, 'prompt_tokens', None)
+    if prompt is None:
+        prompt = getattr(usage, 'input_tokens', 0)
+    completion = getattr(usage, 'completion_tokens', None)
+    if completion is None:
+        completion = getattr(usage, 'output_tokens', 0)
+    details = getattr(usage, 'prompt_tokens_details', None) or getattr(usage, 'input_tokens_details', None)
+    cached  = (getattr(details, 'cached_tokens', 0) or 0) if details else 0
+
+    print(f"[LLM USAGE] {label}: prompt={prompt} cached={cached} completion={completion}")
+    return {'prompt_tokens': prompt, 'cached_tokens': cached, 'completion_tokens': completion}
+
+
+def run_llm_request(api, kwargs, label='chat'):
+    """Run an LLM request to completion. Returns (reply_text, usage_counts)."""
+    if api == 'responses':
+        response = openai_client().responses.create(**kwargs)
+        return response.output_text, usage_counts(response.usage, label)
+    completion = openai_client().chat.completions.create(**kwargs)
+    return completion.choices[0].message.content, usage_counts(completion.usage, label)
+
+
+def stream_llm_request(api, kwargs, usage, label='chat'):
+    """Run an LLM request in streaming mode, yielding text deltas as they arrive.
+
+    `usage` is a dict that is filled with the usage counts once the stream ends.
+    """
+    if api == 'responses':
+        for ev in openai_client().responses.create(stream=True, **kwargs):
+            if ev.type == 'response.output_text.delta' and ev.delta:
+                yield ev.delta
+            elif ev.type == 'response.completed':
+                usage.update(usage_counts(ev.response.usage, label))
+        return
+    for chunk in openai_client().chat.completions.create(stream=True, stream_options={'include_usage': True}, **kwargs):
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        if chunk.usage:
+            usage.update(usage_counts(chunk.usage, label))
+
+
+# ─────────────────────────────────────────────
+#  CAREER OPENER POOL
+# ─────────────────────────────────────────────
+
+CAREER_OPENER_MESSAGES = [
+    {'role': 'system', 'content': CAREER_CLARITY_PROMPT},
+    {'role': 'user', 'content': 'START_CAREER_CLARITY_SESSION'},
+]
+# Openers generated from a different prompt are stale and never served
+CAREER_OPENER_HASH   = hashlib.sha256(json.dumps(CAREER_OPENER_MESSAGES).encode()).hexdigest()
+CAREER_OPENER_TARGET = 12   # pool size after a refill
+CAREER_OPENER_LOW    = 4    # refill when fewer than this remain
+
+OPENER_REFILL_LEASE    = 'career_opener_refill'
+OPENER_REFILL_SECONDS  = 300   # longer than a generation call; a crashed refill frees the pool after this
+
+
+def generate_career_openers(n):
+    """Ask the model for `n` opening messages in a single call."""
+    completion = openai_client().chat.completions.create(
+        model='gpt-4o',
+        messages=CAREER_OPENER_MESSAGES,
+        max_tokens=500,
+        temperature=0.7,
+        n=n,
+    )
+    usage_counts(completion.usage, 'career_opener')
+    return [c.message.content for c in completion.choices if c.message.content]
+
+
+def take_career_opener():
+    """Pop a random current opener from the pool, or None if it is empty. Schedules a refill when low."""
+    opening_text = None
+    for _ in range(3):
+        opener = (CareerOpener.query
+                  .filter_by(prompt_hash=CAREER_OPENER_HASH)
+                  .order_by(db.func.random())
+                  .first())
+        if not opener:
+            break
+        # Delete-by-id so two concurrent requests never serve the same row
+        if CareerOpener.query.filter_by(id=opener.id).delete(synchronize_session=False):
+            opening_text = opener.content
+            db.session.commit()
+            break
+        db.session.rollback()
+
+    remaining = CareerOpener.query.filter_by(prompt_hash=CAREER_OPENER_HASH).count()
+    if remaining < CAREER_OPENER_LOW:
+        run_in_background(refill_career_openers)
+    return opening_text
+
+
+def refill_career_openers():
+    """Drop stale openers and top the pool back up to CAREER_OPENER_TARGET. A database lease
+    keeps the worker processes from refilling at once and paying for the openers twice."""
+    if not acquire_lease(OPENER_REFILL_LEASE, OPENER_REFILL_SECONDS):
+        return   # another worker is refilling
+    try:
+        CareerOpener.query.filter(CareerOpener.prompt_hash != CAREER_OPENER_HASH).delete(synchronize_session=False)
+        db.session.commit()
+        needed = CAREER_OPENER_TARGET - CareerOpener.query.filter_by(prompt_hash=CAREER_OPENER_HASH).count()
+        db.session.close()   # don't hold a connection during the model call
+        if needed <= 0:
+            return
+        openers = generate_career_openers(needed)
+        # Recount: if the lease ran out during a slow call, another refill may have landed
+        needed = CAREER_OPENER_TARGET - CareerOpener.query.filter_by(prompt_hash=CAREER_OPENER_HASH).count()
+        for opener in openers[:max(needed, 0)]:
+            db.session.add(CareerOpener(prompt_hash=CAREER_OPENER_HASH, content=opener))
+        db.session.commit()
+    finally:
+        db.session.rollback()
+        release_lease(OPENER_REFILL_LEASE)
+
+
 # ─────────────────────────────────────────────
 #  ROUTES — CHAT
 # ─────────────────────────────────────────────
@@ -905,23 +3262,25 @@ def chat():
     user_message = data.get('message', '').strip()
     mode         = data.get('mode', 'chat')
     thread_id    = data.get('thread_id')      # None = start a new thread
+    stream       = bool(data.get('stream'))   # True = Server-Sent Events token stream
     user_id      = session['user_id']
-    attached_files = data.get('files', [])   # [{filename, content, is_image, base64_data}]
+    attached_files = data.get('files', [])   # [{file_id}] from /api/upload
 
-    if not user_message and not attached_files:
+    # Resolved up front so a request whose only files aren't the user's counts as empty
+    attachments = resolve_attachments(user_id, attached_files)
+    if not user_message and not attachments:
         return jsonify({'success': False, 'error': 'No message provided'}), 400
 
     if not user_message:
         user_message = ''
 
     # ── Look up user for personalisation ──
-    user = User.query.get(user_id)
-    first_name = user.name.split()[0] if user and user.name else 'there'
-    name_prefix = f"The user's name is {first_name}. Address them by their first name naturally in conversation.\n\n"
+    user = cached_user(user_id)
+    first_name = user['name'].split()[0] if user and user['name'] else 'there'
 
     # ── Paywall check for career mode ──
     if mode == 'career':
-        if not user or user.tier < 1:
+        if not has_tier(user_id, 1):
             return jsonify({
                 'success':  False,
                 'paywall':  True,
@@ -943,150 +3302,136 @@ def chat():
         db.session.add(thread)
         db.session.flush()   # get id before commit
 
+    # ── Build user content block (handles file attachments) ──
+    excerpts     = retrieve_excerpts(thread.id, user_message, attachments)
+    user_content = build_user_content(user_message, attachments, excerpts)
+
+    # ── Build conversation history for the API ──
+    # Newest turns that fit the mode's token budget, preceded by the thread's rolling summary
+    past, fold_boundary = assemble_context(thread, user_content, mode)
+
     # ── Persist user message ──
-    user_msg = Message(thread_id=thread.id, role='user', content=user_message, mode=mode)
+    # token_count covers what later turns resend: the attachments, but not this turn's excerpts
+    user_msg = Message(thread_id=thread.id, role='user', content=user_message, mode=mode,
+                       token_count=count_tokens(build_user_content(user_message, attachments)))
+    user_msg.attachments = [MessageAttachment(upload_id=a['upload_id']) for a in attachments if a.get('upload_id')]
     db.session.add(user_msg)
 
-    # ── Build conversation history for the API ──
-    history = Message.query.filter_by(thread_id=thread.id).order_by(Message.created_at).all()
-    # Include up to last 20 messages (excluding the one we just added)
-    past = [{'role': m.role, 'content': m.content} for m in history[-20:]]
+    # Count how many user messages exist in this thread (including current)
+    question_number = None
+    if mode == 'career':
+        user_msg_count  = Message.query.filter_by(thread_id=thread.id, role='user').count()
+        question_number = min(user_msg_count, 8)
 
-    # ── Build user content block (handles file attachments) ──
-    has_images   = any(f.get('is_image') for f in attached_files)
-    text_context = ''
-    for f in attached_files:
-        if not f.get('is_image') and f.get('content'):
-            text_context += f"\n\n[Attached file: {f['filename']}]\n{f['content']}"
+    api, request_kwargs = build_llm_request(mode, first_name, past, question_number)
 
-    if has_images:
-        # Vision-compatible content array
-        user_content = []
-        if user_message or text_context:
-            user_content.append({'type': 'text', 'text': (user_message + text_context).strip()})
-        for f in attached_files:
-            if f.get('is_image') and f.get('base64_data'):
-                user_content.append({'type': 'image_url', 'image_url': {'url': f['base64_data'], 'detail': 'auto'}})
-    else:
-        user_content = (user_message + text_context).strip()
+    # ── Phase 1: commit the user turn and release the connection ──
+    # Nothing holds a transaction or pooled connection while the model is running.
+    thread.updated_at = datetime.utcnow()
+    thread_id = thread.id
+    db.session.commit()
+    db.session.close()
+
+    # Turns that just fell out of the budget are folded into the summary off the request path
+    if fold_boundary:
+        run_in_background(fold_thread_summary, thread_id, fold_boundary)
 
-    # Replace last user message content with enriched version (files included)
-    if past and past[-1]['role'] == 'user':
-        past[-1]['content'] = user_content
-    elif user_content:
-        past.append({'role': 'user', 'content': user_content})
+    if stream:
+        return Response(
+            stream_with_context(_stream_chat_reply(api, request_kwargs, thread_id, mode, question_number)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
 
+    # ── Phase 2: call the model (no DB work) ──
     try:
-        if mode == 'career':
-            # Count how many user messages exist in this thread (including current)
-            user_msg_count = Message.query.filter_by(
-                thread_id=thread.id, role='user'
-            ).count()
-            question_number = min(user_msg_count, 8)
-
-            messages = [{'role': 'system', 'content': name_prefix + CAREER_CLARITY_PROMPT}] + past
-
-            # ── SERVER-SIDE TRIGGER: Insight Card after Q4 ──
-            # When user has answered exactly 4 questions, inject a hard instruction
-            if user_msg_count == 4:
-                messages.append({
-                    'role': 'system',
-                    'content': (
-                        'SYSTEM TRIGGER: The user has just answered Question 4. '
-                        'You MUST now deliver the Insight Card as defined in the AFTER QUESTION 4 section. '
-                        'Do not ask Question 5 yet — deliver the insight card first, then end with Question 5 of 8. '
-                        'This is mandatory. Do not skip it.'
-                    )
-                })
-
-            # ── SERVER-SIDE TRIGGER: Full Report after Q8 ──
-            # When user has answered 8 or more questions, force the report
-            if user_msg_count >= 8:
-                messages.append({
-                    'role': 'system',
-                    'content': (
-                        'SYSTEM TRIGGER: The user has now answered all 8 questions. '
-                        'You MUST produce the complete Career Clarity Report RIGHT NOW. '
-                        'START YOUR RESPONSE DIRECTLY with "# 🎯 Your Career Clarity Report" — '
-                        'do NOT add any reflection, summary, or preamble before this header. '
-                        'No "What I heard is that...", no "Based on our conversation...", '
-                        'no opener of any kind. Go straight to the report. '
-                        'Use the exact structure: '
-                        'What I Heard → 3 Hidden Transferable Skills → LinkedIn Transformation Plan '
-                        '(3 headline options, full ~150 word About section in first person, '
-                        '10 LinkedIn skills, 3 Featured section ideas) → '
-                        '90-Day Career Clarity Roadmap (Week 1-2 Foundations, Week 3-4 Translation, '
-                        'Month 2 Application, Month 3 Positioning & Launch — 3-4 specific actions each) → '
-                        'Your Single Next Step (one specific action based on their timeline) → '
-                        'Upgrade CTA. '
-                        'Make every element specific to THIS person — use their exact words throughout. '
-                        'This is the $67 deliverable. Make it exceptional.'
-                    )
-                })
-
-            completion = client.chat.completions.create(
-                model='gpt-4o',
-                messages=messages,
-                max_tokens=4000,
-                temperature=0.75,
-            )
-            assistant_text = completion.choices[0].message.content
-
-            asst_msg = Message(thread_id=thread.id, role='assistant', content=assistant_text, mode=mode)
-            db.session.add(asst_msg)
-            thread.updated_at = datetime.utcnow()
-            db.session.commit()
+        assistant_text, usage = run_llm_request(api, request_kwargs, label=mode)
+    except Exception as e:
+        # The user turn is already saved, so the thread stays coherent and can be retried
+        return jsonify({'success': False, 'error': str(e), 'thread_id': thread_id}), 500
 
-            return jsonify({
-                'success': True,
-                'message': assistant_text,
-                'mode': mode,
-                'thread_id': thread.id,
-                'thread': thread.to_dict(),
-                'question_number': question_number,
-            })
-
-        elif mode == 'research':
-            system         = name_prefix + SYSTEM_PROMPT + RESEARCH_SUFFIX
-            input_messages = [{'role': 'system', 'content': system}] + past
-            response       = client.responses.create(
-                model  = 'gpt-4o',
-                tools  = [{'type': 'web_search_preview'}],
-                input  = input_messages,
-            )
-            assistant_text = response.output_text
+    # ── Phase 3: persist the reply in a short second transaction ──
+    try:
+        thread_dict = persist_assistant_reply(thread_id, mode, assistant_text, usage)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e), 'thread_id': thread_id}), 500
+
+    result = {
+        'success':   True,
+        'message':   assistant_text,
+        'mode':      mode,
+        'thread_id': thread_id,
+        'thread':    thread_dict,
+    }
+    if question_number is not None:
+        result['question_number'] = question_number
+    return jsonify(result)
+
+
+def persist_assistant_reply(thread_id, mode, assistant_text, usage=None):
+    """Save an assistant reply and bump the thread in its own short transaction. Returns the thread dict."""
+    thread = db.session.get(Thread, thread_id)
+    db.session.add(Message(thread_id=thread_id, role='assistant', content=assistant_text, mode=mode,
+                           **(usage or {})))
+    thread.updated_at = datetime.utcnow()
+    thread_dict = thread.to_dict()   # serialise before commit expires the instance
+    db.session.commit()
+    db.session.close()
+    return thread_dict
 
-        else:
-            system = name_prefix + SYSTEM_PROMPT
-            if mode == 'document':
-                system += DOCUMENT_SUFFIX
-
-            messages   = [{'role': 'system', 'content': system}] + past
-            completion = client.chat.completions.create(
-                model       = 'gpt-4o',
-                messages    = messages,
-                max_tokens  = 4096 if mode == 'document' else 2048,
-                temperature = 0.7,
-            )
-            assistant_text = completion.choices[0].message.content
-
-        # ── Persist assistant reply ──
-        asst_msg = Message(thread_id=thread.id, role='assistant', content=assistant_text, mode=mode)
-        db.session.add(asst_msg)
-        thread.updated_at = datetime.utcnow()
-        db.session.commit()
 
-        return jsonify({
+def _sse(payload):
+    """Format one Server-Sent Events frame."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _finish_abandoned_reply(deltas, parts, usage, thread_id, mode):
+    """Read the rest of a reply whose client went away, then save it like any other."""
+    for delta in deltas:
+        parts.append(delta)
+    persist_assistant_reply(thread_id, mode, ''.join(parts), usage)
+    print(f"[CHAT] Client left thread {thread_id} mid-reply; saved the reply in the background")
+
+
+def _stream_chat_reply(api, request_kwargs, thread_id, mode, question_number):
+    """Forward model tokens as SSE frames, then persist the full assistant reply."""
+    parts  = []
+    usage  = {}
+    deltas = stream_llm_request(api, request_kwargs, usage, label=mode)
+    saved  = False
+    try:
+        yield _sse({'type': 'start', 'thread_id': thread_id, 'mode': mode})
+        for delta in deltas:
+            parts.append(delta)
+            yield _sse({'type': 'delta', 'text': delta})
+
+        assistant_text = ''.join(parts)
+        thread_dict    = persist_assistant_reply(thread_id, mode, assistant_text, usage)
+        saved          = True
+        done = {
+            'type':      'done',
             'success':   True,
             'message':   assistant_text,
             'mode':      mode,
-            'thread_id': thread.id,
-            'thread':    thread.to_dict(),
-        })
+            'thread_id': thread_id,
+            'thread':    thread_dict,
+        }
+        if question_number is not None:
+            done['question_number'] = question_number
+        yield _sse(done)
+
+    except GeneratorExit:
+        # The server closes this generator when the client disconnects (tab closed, network
+        # dropped). The user turn is already committed, so finish the model's stream off the
+        # request and save the reply; it's in the thread when they come back.
+        if not saved:
+            run_in_background(_finish_abandoned_reply, deltas, parts, usage, thread_id, mode)
+        raise
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        yield _sse({'type': 'error', 'success': False, 'error': str(e), 'thread_id': thread_id})
 
 
 @app.route('/api/clear', methods=['POST'])
@@ -1098,12 +3443,11 @@ def clear():
 @app.route('/api/career/start', methods=['POST'])
 @login_required
 def career_start():
-    """Create a new career clarity thread and get the opening message from the AI."""
+    """Create a new career clarity thread with an opening message from the pre-generated pool."""
     user_id = session['user_id']
-    user    = User.query.get(user_id)
 
     # Paywall — Tier 1 or above required
-    if not user or user.tier < 1:
+    if not has_tier(user_id, 1):
         return jsonify({
             'success':  False,
             'paywall':  True,
@@ -1111,27 +3455,24 @@ def career_start():
             'checkout': '/api/checkout/tier1',
         }), 403
 
-    thread = Thread(
-        title='Career Clarity Journey',
-        mode='career',
-        user_id=user_id,
-    )
-    db.session.add(thread)
-    db.session.flush()
+    # Normally a DB read from the pre-generated pool; fall back to a live call if it is empty
+    opening_text = take_career_opener()
+    if opening_text is None:
+        # Release the connection before the model call; the thread is only created once we have an opener
+        db.session.close()
+        try:
+            opening_text = generate_career_openers(1)[0]
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
 
-    # Get opening message from AI
     try:
-        messages = [
-            {'role': 'system', 'content': CAREER_CLARITY_PROMPT},
-            {'role': 'user', 'content': 'START_CAREER_CLARITY_SESSION'},
-        ]
-        completion = client.chat.completions.create(
-            model='gpt-4o',
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7,
+        thread = Thread(
+            title='Career Clarity Journey',
+            mode='career',
+            user_id=user_id,
         )
-        opening_text = completion.choices[0].message.content
+        db.session.add(thread)
+        db.session.flush()
 
         # Save the opening as an assistant message
         asst_msg = Message(
@@ -1177,62 +3518,73 @@ def checkout_tier2():
 
 
 def _get_user_email(user_id):
-    user = User.query.get(user_id)
-    return user.email if user else ''
+    user = cached_user(user_id)
+    return user['email'] if user else ''
+
+
+STRIPE_BATCH_SIZE    = 20
+STRIPE_POLL_SECONDS  = 5
+STRIPE_LEASE_SECONDS = 60
+STRIPE_MAX_ATTEMPTS  = 6
+
+_stripe_wakeup = threading.Event()
 
 
 @app.route('/api/stripe/webhook', methods=['POST'])
 def stripe_webhook():
-    """Stripe sends payment events here. We upgrade user tier on success."""
+    """Stripe sends payment events here. Verified events are stored by event id and
+    acknowledged at once; the Stripe worker applies them (see apply_stripe_event).
+    Redeliveries of an event already stored are acknowledged without doing anything."""
     payload    = request.get_data()
     sig_header = request.headers.get('Stripe-Signature', '')
 
     try:
         if STRIPE_WEBHOOK_SECRET:
-            event = stripe.Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
-        else:
-            # Dev mode — trust the payload directly (never in production)
-            import json
-            event = json.loads(payload)
+            stripe_api().Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
+        # Dev mode (no secret) — trust the payload directly (never in production)
+        event = json.loads(payload)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-    event_type = event.get('type') if isinstance(event, dict) else event['type']
+    if not event.get('id'):
+        return jsonify({'error': 'Event id missing'}), 400
+
+    db.session.add(StripeEvent(event_id=event['id'], type=event.get('type', ''), payload=payload.decode('utf-8')))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'received': True, 'duplicate': True}), 200
+
+    _stripe_wakeup.set()
+    return jsonify({'received': True}), 200
+
+
+def apply_stripe_event(event):
+    """Apply a Stripe event to our users. Runs in the worker's transaction; no commit here.
+    Returns the id of the user it changed, if any, so the caller can invalidate it after committing."""
+    event_type = event.get('type')
 
     if event_type == 'checkout.session.completed':
         session_obj = event['data']['object']
         client_ref  = session_obj.get('client_reference_id')  # our user_id
         customer_id = session_obj.get('customer')
         mode        = session_obj.get('mode')          # 'payment' or 'subscription'
-        price_id    = None
-
-        # Get price from line items
-        line_items = session_obj.get('line_items', {}).get('data', [])
-        if line_items:
-            price_id = line_items[0].get('price', {}).get('id')
-        else:
-            # Fallback: check metadata or amount
-            price_id = session_obj.get('metadata', {}).get('price_id')
 
-        if client_ref:
-            try:
-                user = User.query.get(int(client_ref))
-                if user:
-                    if customer_id:
-                        user.stripe_customer_id = customer_id
-                    # Determine tier from mode
-                    if mode == 'subscription':
-                        user.tier = 2
-                    else:
-                        user.tier = 1
-                    db.session.commit()
-
-                    # Tag in GHL
-                    if user.ghl_contact_id:
-                        tag = 'T2T Tier 2' if user.tier == 2 else 'T2T Tier 1'
-                        _tag_ghl_contact(user.ghl_contact_id, tag)
-            except Exception:
-                pass  # Log silently — don't fail the webhook
+        user = db.session.get(User, int(client_ref)) if str(client_ref or '').isdigit() else None
+        if user:
+            if customer_id:
+                user.stripe_customer_id = customer_id
+            # Determine tier from mode
+            if mode == 'subscription':
+                user.tier = 2
+            else:
+                user.tier = 1
+
+            # Tag in GHL — sent by the outbox once the tier change commits
+            tag = 'T2T Tier 2' if user.tier == 2 else 'T2T Tier 1'
+            enqueue_ghl('tag_contact', user.id, tag=tag)
+            return user.id
 
     elif event_type in ('customer.subscription.deleted', 'customer.subscription.paused'):
         # Downgrade Tier 2 users if subscription cancelled
@@ -1242,30 +3594,43 @@ def stripe_webhook():
             user = User.query.filter_by(stripe_customer_id=customer_id).first()
             if user and user.tier == 2:
                 user.tier = 0
-                db.session.commit()
+                return user.id
+    return None
 
-    return jsonify({'received': True}), 200
+
+def drain_stripe_events():
+    """Apply one batch of stored events, each in its own transaction. Returns how many were claimed."""
+    rows = claim_due_rows(StripeEvent, STRIPE_BATCH_SIZE, STRIPE_LEASE_SECONDS)
+    for row in rows:
+        try:
+            user_id = apply_stripe_event(json.loads(row.payload))
+            row.status     = 'applied'
+            row.attempts  += 1
+            row.applied_at = datetime.utcnow()
+            row.last_error = None
+            db.session.commit()
+            if user_id:
+                invalidate_user(user_id)
+        except Exception as e:
+            db.session.rollback()
+            retry_or_dead_letter(row, e, STRIPE_MAX_ATTEMPTS, 'failed', 'STRIPE EVENTS')
+            db.session.commit()
+    if rows:
+        wake_ghl_outbox()
+    return len(rows)
 
 
-def _tag_ghl_contact(contact_id, tag):
-    """Add a tag to a GHL contact."""
-    try:
-        http_requests.post(
-            f'{GHL_BASE}/contacts/{contact_id}/tags',
-            headers=ghl_headers(),
-            json={'tags': [tag]},
-            timeout=10,
-        )
-    except Exception:
-        pass
+def start_stripe_worker():
+    start_queue_worker('stripe-events', 'STRIPE EVENTS', _stripe_wakeup, drain_stripe_events,
+                       STRIPE_BATCH_SIZE, STRIPE_POLL_SECONDS)
 
 
 @app.route('/api/user/tier', methods=['GET'])
 @login_required
 def get_user_tier():
     """Return the current user's tier."""
-    user = User.query.get(session['user_id'])
-    return jsonify({'tier': user.tier if user else 0})
+    user = cached_user(session['user_id'])
+    return jsonify({'tier': user['tier'] if user else 0})
 
 
 @app.route('/api/admin/set-tier', methods=['POST'])
@@ -1282,13 +3647,170 @@ def admin_set_tier():
         return jsonify({'error': 'User not found'}), 404
     user.tier = tier
     db.session.commit()
+    invalidate_user(user.id)
     return jsonify({'success': True, 'email': user.email, 'tier': user.tier})
 
 
+@app.route('/api/admin/user-cache', methods=['POST'])
+def admin_user_cache():
+    """Admin endpoint reporting this worker's user-cache counters; "clear": true empties this
+    worker's in-process entries. Protected by SECRET_KEY."""
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    if data.get('clear'):
+        user_cache.clear()
+    return jsonify({'pid': os.getpid(), **user_cache.stats()})
+
+
+@app.route('/api/admin/prompt-cache', methods=['POST'])
+def admin_prompt_cache():
+    """Admin endpoint reporting prompt-cache hit rate per mode. Protected by SECRET_KEY."""
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    rows = (db.session.query(Message.mode,
+                             db.func.count(Message.id),
+                             db.func.sum(Message.prompt_tokens),
+                             db.func.sum(Message.cached_tokens))
+            .filter(Message.role == 'assistant', Message.prompt_tokens.isnot(None))
+            .group_by(Message.mode)
+            .all())
+    report = {}
+    for mode, calls, prompt, cached in rows:
+        report[mode] = {
+            'calls':         calls,
+            'prompt_tokens': prompt or 0,
+            'cached_tokens': cached or 0,
+            'hit_rate':      round((cached or 0) / prompt, 3) if prompt else 0.0,
+        }
+    return jsonify({'modes': report})
+
+
+@app.route('/api/admin/ghl-outbox', methods=['POST'])
+def admin_ghl_outbox():
+    """Admin endpoint reporting the GHL outbox backlog and dead letters. Protected by SECRET_KEY.
+
+    Pass {"requeue": true} to move every dead-lettered row back to pending.
+    """
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    requeued = 0
+    if data.get('requeue'):
+        requeued = (GhlOutbox.query.filter_by(status='dead')
+                    .update({'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()},
+                            synchronize_session=False))
+        db.session.commit()
+        wake_ghl_outbox()
+    counts = dict(db.session.query(GhlOutbox.status, db.func.count(GhlOutbox.id))
+                  .group_by(GhlOutbox.status).all())
+    oldest = (db.session.query(db.func.min(GhlOutbox.created_at))
+              .filter(GhlOutbox.status == 'pending').scalar())
+    dead = GhlOutbox.query.filter_by(status='dead').order_by(GhlOutbox.id.desc()).limit(20).all()
+    return jsonify({
+        'counts':         counts,
+        'oldest_pending': oldest.isoformat() if oldest else None,
+        'requeued':       requeued,
+        'dead':           [row.to_dict() for row in dead],
+        'dispatcher':     _worker_pids.get('ghl-outbox') == os.getpid(),
+    })
+
+
+@app.route('/api/admin/stripe-events', methods=['POST'])
+def admin_stripe_events():
+    """Admin endpoint reporting the Stripe event backlog and failures. Protected by SECRET_KEY.
+
+    Pass {"requeue": true} to retry every failed event.
+    """
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    requeued = 0
+    if data.get('requeue'):
+        requeued = (StripeEvent.query.filter_by(status='failed')
+                    .update({'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()},
+                            synchronize_session=False))
+        db.session.commit()
+        _stripe_wakeup.set()
+    counts = dict(db.session.query(StripeEvent.status, db.func.count(StripeEvent.id))
+                  .group_by(StripeEvent.status).all())
+    failed = StripeEvent.query.filter_by(status='failed').order_by(StripeEvent.id.desc()).limit(20).all()
+    return jsonify({
+        'counts':   counts,
+        'requeued': requeued,
+        'failed':   [{'event_id': e.event_id, 'type': e.type, 'attempts': e.attempts,
+                      'last_error': e.last_error, 'received_at': e.received_at.isoformat()} for e in failed],
+    })
+
+
+@app.route('/api/admin/integrations', methods=['POST'])
+def admin_integrations():
+    """Admin endpoint reporting circuit state and per-endpoint latency/errors for each upstream
+    in this worker. Protected by SECRET_KEY."""
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'pid': os.getpid(), 'upstreams': {name: c.stats() for name, c in INTEGRATIONS.items()}})
+
+
+@app.route('/api/admin/schema', methods=['POST'])
+def admin_schema():
+    """Admin endpoint reporting the schema version, migration history, and this worker's boot
+    timings and connection pool. Protected by SECRET_KEY."""
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    history = SchemaMigration.query.order_by(SchemaMigration.version).all()
+    return jsonify({
+        'version':    history[-1].version if history else 0,
+        'latest':     MIGRATIONS[-1][0],
+        'migrations': [{'version': m.version, 'name': m.name, 'duration_ms': m.duration_ms,
+                        'applied_at': m.applied_at.isoformat()} for m in history],
+        'boot':       BOOT_REPORT,
+        'pool':       db.engine.pool.status(),
+    })
+
+
+@app.route('/api/admin/career-prompt', methods=['POST'])
+def admin_career_prompt():
+    """Admin endpoint reporting the career prompt size per question and the tokens saved
+    by sending only the relevant methodology sections. Protected by SECRET_KEY."""
+    data = request.get_json() or {}
+    if data.get('secret', '') != app.secret_key:
+        return jsonify({'error': 'Unauthorized'}), 401
+    questions = {}
+    for question_number in range(1, 9):
+        kb = career_prompt(question_number)
+        questions[question_number] = {
+            'sections':      kb['sections'],
+            'prompt_tokens': kb['tokens'],
+            'saved_tokens':  kb['full_tokens'] - kb['tokens'],
+        }
+    return jsonify({
+        'selection':          CAREER_KB_SELECTION,
+        'full_prompt_tokens': count_tokens(CAREER_CLARITY_PROMPT),
+        'section_tokens':     methodology_section_tokens(),
+        'questions':          questions,
+    })
+
+
 # ─────────────────────────────────────────────
 #  ENTRYPOINT
 # ─────────────────────────────────────────────
 
+@app.before_request
+def note_first_request():
+    """Record time-to-first-request for this process (a forked worker counts from the preload)."""
+    if 'first_request_ms' not in BOOT_REPORT:
+        BOOT_REPORT['first_request_ms'] = round((time.perf_counter() - _boot_started) * 1000, 1)
+        print(f"[BOOT] first request ({request.path}) arrived after {BOOT_REPORT['first_request_ms']}ms "
+              f"in pid {os.getpid()}")
+
+
+BOOT_REPORT['ready_ms'] = round((time.perf_counter() - _boot_started) * 1000, 1)
+print(f"[BOOT] app ready in {BOOT_REPORT['ready_ms']}ms")
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(
@@ -0,0 +1,139 @@
+"""
+DB concurrency benchmark
+------------------------
+Runs the chat write path from many threads at once, with readers listing threads and
+paging messages alongside, and compares SQLite journal modes. Each mode gets a fresh
+database in its own interpreter, since the engine is configured when app.py is imported:
+
+    python benchmarks/bench_db_concurrency.py [--modes delete,wal] [--writers 8]
+        [--readers 8] [--seconds 10]
+
+A "turn" is what /api/chat does against the database, minus the model call: load the
+thread and its context window, commit the user message, then commit the assistant reply
+in a second short transaction. "locked" counts operations that gave up with "database
+is locked" after the busy timeout.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER_TEXT  = 'How do I turn my classroom experience into a corporate training offer? ' * 4
+REPLY_TEXT = 'x' * 3000   # a typical reply is a few KB
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p), len(samples) - 1)] if samples else 0.0
+
+
+def run_mode(args):
+    """Child process: run the workload against this interpreter's database and print JSON."""
+    from sqlalchemy.exc import OperationalError
+    from app import app, db, Thread, Message, assemble_context, count_tokens, persist_assistant_reply
+
+    with app.app_context():
+        journal = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        threads = [Thread(title=f'bench-{i}', mode='document') for i in range(args.writers)]
+        db.session.add_all(threads)
+        db.session.commit()
+        thread_ids = [t.id for t in threads]
+
+    stop    = time.perf_counter() + args.seconds
+    results = {'turn': [], 'read': [], 'locked': 0}
+    lock    = threading.Lock()
+
+    def chat_turn(thread_id):
+        thread = db.session.get(Thread, thread_id)
+        assemble_context(thread, USER_TEXT, 'document')
+        db.session.add(Message(thread_id=thread_id, role='user', content=USER_TEXT, mode='document',
+                               token_count=count_tokens(USER_TEXT)))
+        thread.updated_at = datetime.utcnow()
+        db.session.commit()
+        db.session.close()
+        persist_assistant_reply(thread_id, 'document', REPLY_TEXT)
+
+    def read_page(thread_id):
+        Thread.query.order_by(Thread.updated_at.desc(), Thread.id.desc()).limit(30).all()
+        (Message.query.filter_by(thread_id=thread_id)
+         .order_by(Message.created_at.desc(), Message.id.desc()).limit(50).all())
+        db.session.close()
+
+    def worker(kind, fn, thread_id):
+        with app.app_context():
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                try:
+                    fn(thread_id)
+                except OperationalError as e:
+                    db.session.rollback()
+                    if 'locked' not in str(e):
+                        raise
+                    with lock:
+                        results['locked'] += 1
+                    continue
+                with lock:
+                    results[kind].append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=worker, args=('turn', chat_turn, tid)) for tid in thread_ids]
+    workers += [threading.Thread(target=worker, args=('read', read_page, thread_ids[i % len(thread_ids)]))
+                for i in range(args.readers)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    print(json.dumps({
+        'journal':    journal,
+        'turns':      len(results['turn']),
+        'turn_p50':   percentile(results['turn'], 0.5),
+        'turn_p95':   percentile(results['turn'], 0.95),
+        'reads':      len(results['read']),
+        'read_p50':   percentile(results['read'], 0.5),
+        'read_p95':   percentile(results['read'], 0.95),
+        'locked':     results['locked'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', default='delete,wal')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_mode(args)
+
+    print(f"{args.writers} writers + {args.readers} readers for {args.seconds:g}s per mode")
+    print(f"{'journal':<8} {'turns/s':>8} {'turn p50':>9} {'turn p95':>9} "
+          f"{'reads/s':>8} {'read p50':>9} {'read p95':>9} {'locked':>7}")
+    for mode in args.modes.split(','):
+        db_dir = tempfile.mkdtemp(prefix='t2t-bench-')
+        env = dict(os.environ,
+                   DATABASE_URL        = f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+                   SQLITE_JOURNAL_MODE = mode,
+                   OPENAI_API_KEY      = os.environ.get('OPENAI_API_KEY', 'sk-bench'))
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', '--writers', str(args.writers),
+             '--readers', str(args.readers), '--seconds', str(args.seconds)],
+            env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.exit(f"{mode} run failed:\n{proc.stderr[-2000:]}")
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{r['journal']:<8} {r['turns'] / args.seconds:8.1f} {r['turn_p50']:8.1f}ms {r['turn_p95']:8.1f}ms "
+              f"{r['reads'] / args.seconds:8.1f} {r['read_p50']:8.1f}ms {r['read_p95']:8.1f}ms {r['locked']:7d}")
+
+
+if __name__ == '__main__':
+    main()
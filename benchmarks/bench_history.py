@@ -0,0 +1,81 @@
+"""
+History window benchmark
+------------------------
+Shows that per-turn context assembly in chat() stays flat as a thread grows,
+compared with the old "load every message, then slice [-20:]" approach.
+
+Runs against a throwaway SQLite database:
+
+    python benchmarks/bench_history.py [--sizes 10,100,1000,5000] [--repeat 50]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_db_dir = tempfile.mkdtemp(prefix='t2t-bench-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Thread, Message, assemble_context  # noqa: E402
+
+DOCUMENT_SIZED = 'x' * 4000   # a typical document-mode reply is several KB
+
+
+def seed_thread(n_messages):
+    thread = Thread(title=f'bench-{n_messages}', mode='document')
+    db.session.add(thread)
+    db.session.flush()
+    start = datetime.utcnow() - timedelta(minutes=n_messages)
+    db.session.bulk_save_objects([
+        Message(
+            thread_id  = thread.id,
+            role       = 'user' if i % 2 == 0 else 'assistant',
+            content    = DOCUMENT_SIZED,
+            mode       = 'document',
+            created_at = start + timedelta(minutes=i),
+        )
+        for i in range(n_messages)
+    ])
+    db.session.commit()
+    return thread.id
+
+
+def windowed(thread_id):
+    return assemble_context(db.session.get(Thread, thread_id), 'next question', 'document')
+
+
+def full_load(thread_id):
+    history = Message.query.filter_by(thread_id=thread_id).order_by(Message.created_at).all()
+    return [{'role': m.role, 'content': m.content} for m in history[-20:]]
+
+
+def time_ms(fn, thread_id, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(thread_id)
+        db.session.expire_all()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,5000')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        print(f"{'messages':>10} {'windowed ms':>12} {'full load ms':>13}")
+        for size in (int(s) for s in args.sizes.split(',')):
+            thread_id = seed_thread(size)
+            windowed_ms = time_ms(windowed, thread_id, args.repeat)
+            full_ms     = time_ms(full_load, thread_id, args.repeat)
+            print(f"{size:>10} {windowed_ms:>12.2f} {full_ms:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Search benchmark
+----------------
+Times /api/search's message query for one user in a database shared with many others,
+since the cost that matters is how much of everyone else's history a query has to touch.
+Seeds a throwaway SQLite database with synthetic conversations, then runs common,
+selective and prefix queries:
+
+    python benchmarks/bench_search.py [--users 500] [--messages 250000] [--repeat 20]
+
+Word frequencies are skewed, so "training" appears in most messages while the selective
+terms appear in a handful.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix='t2t-bench-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, text, User, search_backend, search_messages  # noqa: E402
+
+COMMON    = ['training', 'learning', 'course', 'session', 'module', 'participants', 'outcomes']
+VOCAB     = COMMON + [f'term{i}' for i in range(5000)]
+WEIGHTS   = [200] * len(COMMON) + [1 / (i + 1) for i in range(5000)]
+QUERIES   = ['training', 'training outcomes', 'learn', 'partic', 'term4321', 'module term17', 'course t']
+THREADS_PER_USER = 10
+
+
+def seed(n_users, n_messages):
+    rng = random.Random(17)
+    users = [User(name=f'bench {i}', email=f'bench{i}@example.com') for i in range(n_users)]
+    db.session.add_all(users)
+    db.session.commit()
+    threads = []
+    for user in users:
+        for t in range(THREADS_PER_USER):
+            threads.append({'user_id': user.id, 'title': f'thread {t}'})
+    db.session.execute(text(
+        "INSERT INTO threads (user_id, title, mode, created_at, updated_at) "
+        "VALUES (:user_id, :title, 'chat', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"), threads)
+    thread_ids = [r[0] for r in db.session.execute(text('SELECT id FROM threads ORDER BY id'))]
+    batch = []
+    for i in range(n_messages):
+        batch.append({
+            'thread_id': rng.choice(thread_ids),
+            'role':      'user' if i % 2 == 0 else 'assistant',
+            'content':   ' '.join(rng.choices(VOCAB, WEIGHTS, k=rng.randint(20, 120))),
+        })
+        if len(batch) == 10000 or i == n_messages - 1:
+            db.session.execute(text(
+                "INSERT INTO messages (thread_id, role, content, mode, created_at) "
+                "VALUES (:thread_id, :role, :content, 'chat', CURRENT_TIMESTAMP)"), batch)
+            batch = []
+    db.session.commit()
+    return users[n_users // 2].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=250000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        user_id = seed(args.users, args.messages)
+        print(f"seeded {args.messages} messages for {args.users} users in "
+              f"{time.perf_counter() - start:.1f}s ({search_backend()} backend)")
+        print(f"{'query':<18} {'hits':>5} {'p50 ms':>8} {'max ms':>8}")
+        for q in QUERIES:
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                hits = search_messages(user_id, q, 20)
+                samples.append((time.perf_counter() - t0) * 1000)
+            samples.sort()
+            print(f"{q:<18} {len(hits):>5} {samples[len(samples) // 2]:>8.2f} {samples[-1]:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Startup benchmark
+-----------------
+Profiles a cold start: import time per top-level package (from `python -X importtime`),
+the app's own boot timings, and wall time from spawning a fresh interpreter to the first
+response, over several runs against a throwaway SQLite database:
+
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--budget-ms 1500]
+
+With --budget-ms (or STARTUP_BUDGET_MS) it exits non-zero when the median time-to-first-
+request is over budget, so it can gate a deploy. It always fails if a module that app.py
+loads on first use (openai, stripe, requests) is imported at boot.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT         = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ('openai', 'stripe', 'requests')
+
+# Runs in the child interpreter; everything it reports is relative to BENCH_SPAWNED_AT
+CHILD = f"""
+import json, os, sys, time
+sys.path.insert(0, {ROOT!r})
+spawned = float(os.environ['BENCH_SPAWNED_AT'])
+started = time.time()
+import app
+imported = time.time()
+eager = sorted(m for m in {LAZY_MODULES!r} if m in sys.modules)
+status = app.app.test_client().get('/api/auth/me').status_code
+answered = time.time()
+print(json.dumps({{
+    'interpreter_ms':    (started - spawned) * 1000,
+    'import_ms':         (imported - started) * 1000,
+    'first_response_ms': (answered - spawned) * 1000,
+    'status':            status,
+    'eager':             eager,
+    'boot':              app.BOOT_REPORT,
+}}))
+"""
+
+
+def child_env(db_path):
+    env = dict(os.environ)
+    for key in ('GHL_API_KEY', 'SMTP_SERVER', 'SMTP_USER', 'SMTP_PASSWORD'):
+        env.pop(key, None)   # no background workers or network during the measurement
+    env['DATABASE_URL'] = f'sqlite:///{db_path}'
+    env.setdefault('OPENAI_API_KEY', 'sk-bench')
+    return env
+
+
+def run_child(env, importtime=False):
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    env = dict(env, BENCH_SPAWNED_AT=repr(time.time()))
+    proc = subprocess.run(args, env=env, capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        sys.exit(f"app failed to start:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, proc.stderr
+
+
+def import_times(stderr):
+    """Sum -X importtime's self time (µs) per top-level package."""
+    per_package = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line.split(':', 1)[1].split('|')
+        per_package[name.strip().split('.')[0]] += int(self_us)
+    return per_package
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 0)) or None)
+    args = parser.parse_args()
+
+    env = child_env(os.path.join(tempfile.mkdtemp(prefix='t2t-bench-'), 'bench.db'))
+
+    # Profiling run; also creates the schema, so the timed runs measure a normal boot
+    profile, stderr = run_child(env, importtime=True)
+    per_package = import_times(stderr)
+    total_ms = sum(per_package.values()) / 1000
+    print(f"import time by package ({total_ms:.0f}ms total under -X importtime):")
+    for package, us in per_package.most_common(args.top):
+        print(f"  {package:<24} {us / 1000:8.1f}ms")
+
+    runs = [run_child(env)[0] for _ in range(args.runs)]
+
+    def median(key):
+        return statistics.median(r[key] for r in runs)
+
+    def boot(key):
+        return statistics.median(r['boot'].get(key, 0) for r in runs)
+
+    print(f"\n{args.runs} cold starts (median):")
+    print(f"  interpreter start     {median('interpreter_ms'):8.1f}ms")
+    print(f"  import app            {median('import_ms'):8.1f}ms   (migrate {boot('migrate_ms')}ms, "
+          f"module body to ready {boot('ready_ms')}ms)")
+    print(f"  time to first request {median('first_response_ms'):8.1f}ms   "
+          f"(GET /api/auth/me → {runs[-1]['status']})")
+
+    failed = False
+    eager = sorted({m for r in runs + [profile] for m in r['eager']})
+    if eager:
+        print(f"\nFAIL: imported at boot but meant to load on first use: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None:
+        within = median('first_response_ms') <= args.budget_ms
+        print(f"\n{'ok' if within else 'FAIL'}: time to first request "
+              f"{median('first_response_ms'):.1f}ms vs budget {args.budget_ms:.0f}ms")
+        failed = failed or not within
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
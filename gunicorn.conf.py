@@ -0,0 +1,63 @@
+"""
+Gunicorn configuration
+----------------------
+Serves the app with cooperative (gevent) workers by default, so a slow OpenAI,
+GHL or SMTP call parks a greenlet instead of pinning a whole worker process.
+Every outbound call in app.py goes through the standard socket/ssl modules
+(httpx for OpenAI, requests for GHL, smtplib for email), which gevent patches to
+yield while they wait on the network.
+
+Usage:  gunicorn app:app -c gunicorn.conf.py
+
+Environment overrides:
+    PORT                          bind port (default 5000)
+    GUNICORN_WORKER_CLASS         'gevent' (default) or 'sync'
+    WEB_CONCURRENCY               number of worker processes (default: from CPU count, capped)
+    GUNICORN_WORKER_CONNECTIONS   concurrent requests per gevent worker (default 500)
+    GUNICORN_TIMEOUT              worker timeout in seconds (default 120)
+"""
+
+import multiprocessing
+import os
+import sys
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+
+# Patch the stdlib before app.py (and its HTTP/SSL/SMTP imports) is preloaded,
+# otherwise sockets created at import time would stay blocking.
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        # Make psycopg2 (Postgres on Railway) yield while waiting on the server
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError as e:
+        if os.environ.get('DATABASE_URL', '').startswith(('postgres://', 'postgresql://')):
+            # Without the patch every query blocks the whole hub: all of a worker's greenlets stall
+            print("=" * 78, file=sys.stderr)
+            print(f"[GUNICORN] WARNING: Postgres under gevent without psycogreen ({e}).", file=sys.stderr)
+            print("[GUNICORN] Every query will block its whole worker. pip install -r requirements.txt,", file=sys.stderr)
+            print("[GUNICORN] or set GUNICORN_WORKER_CLASS=sync.", file=sys.stderr)
+            print("=" * 78, file=sys.stderr)
+
+_cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Containers often see every host core, so the CPU-derived defaults are capped; each worker
+# also holds a share of the database connections (DB_MAX_CONNECTIONS in app.py)
+if worker_class == 'gevent':
+    # Each process multiplexes many requests, so one per core (plus one spare) is enough
+    workers            = int(os.environ.get('WEB_CONCURRENCY', min(_cpus + 1, 4)))
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 500))
+else:
+    workers = int(os.environ.get('WEB_CONCURRENCY', min(_cpus * 2 + 1, 9)))
+
+# app.py sizes its connection pool from this; it is preloaded after this file runs
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+timeout          = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive        = 5
+preload_app      = True
@@ -38,6 +38,7 @@ const modeBadgeEl      = document.getElementById('currentModeBadge');
 const modeDescEl       = document.getElementById('modeDescription');
 const welcomeEl        = document.getElementById('welcomeScreen');
 const threadListEl     = document.getElementById('threadList');
+const threadSearchEl   = document.getElementById('threadSearch');
 const threadTitleEl    = document.getElementById('currentThreadTitle');
 const sidebarEl        = document.getElementById('sidebar');
 const overlayEl        = document.getElementById('sidebarOverlay');
@@ -52,7 +53,7 @@ const headerRight      = document.getElementById('headerRight');
 const fileInput        = document.getElementById('fileInput');
 const fileChipsEl      = document.getElementById('fileChips');
 const inputAreaEl      = document.getElementById('inputArea');
-let pendingFiles       = [];  // [{filename, content, is_image, base64_data}]
+let pendingFiles       = [];  // [{file_id, filename, is_image, status, extraction, ready}]
 
 // ── Auth: Login / Signup Panels ──
 const loginPanel    = document.getElementById('loginPanel');
@@ -167,6 +168,17 @@ loginBtn.addEventListener('click', handleLogin);
 loginPassEl.addEventListener('keydown', (e) => { if (e.key === 'Enter') handleLogin(); });
 loginEmailEl.addEventListener('keydown', (e) => { if (e.key === 'Enter') loginPassEl.focus(); });
 
+const LOGIN_LOOKUP_RETRY_MS = 1500;
+
+async function postLogin(email, password) {
+  const res = await fetch('/api/auth/login', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ email, password }),
+  });
+  return res.json();
+}
+
 async function handleLogin() {
   const email    = loginEmailEl.value.trim();
   const password = loginPassEl.value;
@@ -179,12 +191,12 @@ async function handleLogin() {
   loginBtn.textContent = 'Signing in…';
 
   try {
-    const res  = await fetch('/api/auth/login', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ email, password }),
-    });
-    const data = await res.json();
+    let data = await postLogin(email, password);
+    if (data.lookup_pending) {
+      // The server is checking GHL for this email in the background — ask again once it has had time
+      await new Promise(resolve => setTimeout(resolve, LOGIN_LOOKUP_RETRY_MS));
+      data = await postLogin(email, password);
+    }
 
     if (data.success) {
       showApp(data.user);
@@ -319,11 +331,44 @@ async function uploadFile(file) {
   }
 }
 
+// Poll a background extraction job until the server has the file's text, giving up after
+// EXTRACTION_MAX_WAIT_MS so a stuck job can't hold a message back forever
+const EXTRACTION_MAX_WAIT_MS = 90000;
+
+async function waitForExtraction(entry) {
+  const deadline = Date.now() + EXTRACTION_MAX_WAIT_MS;
+  while (Date.now() < deadline) {
+    await new Promise(resolve => setTimeout(resolve, 700));
+    try {
+      const res  = await fetch(`/api/upload/${entry.job_id}`);
+      const data = await res.json();
+      if (data.status === 'pending') continue;
+      Object.assign(entry, data);
+      if (data.status === 'error') console.warn(`Could not extract ${entry.filename}:`, data.error);
+    } catch (e) {
+      entry.status = 'error';
+      entry.error  = 'Could not check the upload';
+    }
+    renderFileChips();
+    return;
+  }
+  entry.status = 'error';
+  entry.error  = 'Timed out reading the file';
+  renderFileChips();
+}
+
+function chipTitle(f) {
+  if (f.status === 'error') return `${f.filename} — ${f.error || 'could not be read'}`;
+  const x = f.extraction;
+  if (!x || !x.pages_total) return f.filename;
+  return `${f.filename} — read ${x.pages_read} of ${x.pages_total} pages` + (x.timed_out ? ' (time limit reached)' : '');
+}
+
 function renderFileChips() {
   if (!fileChipsEl) return;
   fileChipsEl.innerHTML = pendingFiles.map((f, i) => `
     <div class="file-chip">
-      <span title="${f.filename}">${f.is_image ? '🖼 ' : '📄 '}${f.filename}</span>
+      <span title="${chipTitle(f)}">${f.status === 'pending' ? '⏳ ' : f.status === 'error' ? '⚠️ ' : f.is_image ? '🖼 ' : '📄 '}${f.filename}</span>
       <span class="remove-chip" data-idx="${i}">×</span>
     </div>
   `).join('');
@@ -338,9 +383,11 @@ function renderFileChips() {
 async function handleFileList(files) {
   for (const file of files) {
     const result = await uploadFile(file);
-    if (result) pendingFiles.push(result);
+    if (!result) continue;
+    if (result.status === 'pending') result.ready = waitForExtraction(result);
+    pendingFiles.push(result);
+    renderFileChips();
   }
-  renderFileChips();
 }
 
 if (fileInput) {
@@ -441,6 +488,7 @@ clearBtn.addEventListener('click', startNewConversation);
 
 function startNewConversation() {
   currentThreadId = null;
+  messagesBefore  = null;
   messagesEl.innerHTML = '';
   messagesEl.appendChild(welcomeEl);
   welcomeEl.style.display = 'flex';
@@ -484,7 +532,7 @@ async function sendMessage() {
   const displayText = text + (fileNames.length ? `\n\n📎 ${fileNames.join(', ')}` : '');
   addMessage('user', displayText, currentMode);
 
-  const filesToSend = [...pendingFiles];
+  const filesQueued = [...pendingFiles];
   pendingFiles = [];
   renderFileChips();
 
@@ -492,6 +540,18 @@ async function sendMessage() {
   autoResize();
   setLoading(true);
 
+  // Let any background extractions finish (or give up) before sending; the server resolves files by id
+  await Promise.all(filesQueued.map(f => f.ready).filter(Boolean));
+  const failed      = filesQueued.filter(f => f.status === 'error');
+  const filesToSend = filesQueued.filter(f => f.status !== 'error').map(f => ({ file_id: f.file_id }));
+  if (failed.length) {
+    addMessage('assistant', `⚠️ Couldn't read ${failed.map(f => f.filename).join(', ')} — sending your message without it.`, currentMode);
+    if (!text && !filesToSend.length) {
+      setLoading(false);
+      return;
+    }
+  }
+
   try {
     const res = await fetch('/api/chat', {
       method: 'POST',
@@ -501,6 +561,7 @@ async function sendMessage() {
         mode:      currentMode,
         thread_id: currentThreadId,
         files:     filesToSend,
+        stream:    true,
       }),
     });
 
@@ -512,18 +573,20 @@ async function sendMessage() {
       return;
     }
 
-    const data = await res.json();
+    // Validation / paywall errors come back as plain JSON, replies as an SSE stream
+    const isStream = (res.headers.get('Content-Type') || '').includes('text/event-stream');
+    const data     = isStream ? await readChatStream(res, currentMode) : await res.json();
 
     if (data.success) {
       if (!currentThreadId) {
         currentThreadId = data.thread_id;
       }
-      await loadThreads();
+      bumpThread(data.thread || { id: currentThreadId, title: threadTitleEl.textContent });
       updateActiveThread(currentThreadId);
       if (data.thread) {
         threadTitleEl.textContent = data.thread.title;
       }
-      addMessage('assistant', data.message, data.mode);
+      if (!isStream) addMessage('assistant', data.message, data.mode);
       // Update career progress if in career mode
       if (data.mode === 'career' && data.question_number !== undefined) {
         careerQuestionNumber = data.question_number;
@@ -531,6 +594,12 @@ async function sendMessage() {
         showCareerProgress(true);
       }
     } else {
+      // The user turn is saved even when the model call fails — stay on that thread
+      if (data.thread_id && !currentThreadId) {
+        currentThreadId = data.thread_id;
+        await loadThreads();
+        updateActiveThread(currentThreadId);
+      }
       addMessage('assistant', `⚠️ Error: ${data.error || 'Something went wrong. Please try again.'}`, currentMode);
     }
   } catch (err) {
@@ -540,8 +609,68 @@ async function sendMessage() {
   }
 }
 
+// Render an SSE chat reply as tokens arrive. Resolves with the final 'done' (or 'error') event.
+async function readChatStream(res, mode) {
+  const reader  = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer    = '';
+  let raw       = '';
+  let bubbleEl  = null;
+  let pending   = false;
+  let result    = { success: false, error: 'The response ended unexpectedly.' };
+
+  const render = () => {
+    pending = false;
+    bubbleEl.setAttribute('data-raw', raw);
+    bubbleEl.innerHTML = marked.parse(raw);
+    scrollToBottom();
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const frames = buffer.split('\n\n');
+    buffer = frames.pop();
+    for (const frame of frames) {
+      if (!frame.startsWith('data: ')) continue;
+      const event = JSON.parse(frame.slice(6));
+
+      if (event.type === 'start' && !currentThreadId) {
+        currentThreadId = event.thread_id;
+      } else if (event.type === 'delta') {
+        if (!bubbleEl) {
+          thinkingEl.style.display = 'none';
+          bubbleEl = addMessage('assistant', '', mode);
+        }
+        raw += event.text;
+        if (!pending) {
+          pending = true;
+          requestAnimationFrame(render);
+        }
+      } else if (event.type === 'done' || event.type === 'error') {
+        result = event;
+      }
+    }
+  }
+
+  if (bubbleEl) {
+    if (result.success) raw = result.message;
+    render();
+  }
+  return result;
+}
+
 // ── Render Message ──
 function addMessage(role, text, mode) {
+  const { msg, content } = buildMessage(role, text, mode);
+  messagesEl.appendChild(msg);
+  scrollToBottom();
+  return content;
+}
+
+function buildMessage(role, text, mode) {
   const msg = document.createElement('div');
   msg.className = `message ${role}`;
 
@@ -572,75 +701,171 @@ function addMessage(role, text, mode) {
   bubble.appendChild(content);
   msg.appendChild(avatar);
   msg.appendChild(bubble);
-  messagesEl.appendChild(msg);
-  scrollToBottom();
+  return { msg, content };
 }
 
 // ── Thread List ──
+const THREAD_PAGE_SIZE = 50;
+let threadCursor   = null;    // next_cursor from /api/threads; null once the last page is in
+let threadsLoading = false;
+
+// Reload the sidebar from the first page
 async function loadThreads() {
+  threadCursor = null;
+  await loadMoreThreads(true);
+}
+
+async function loadMoreThreads(reset = false) {
+  if (threadsLoading || (!reset && !threadCursor)) return;
+  threadsLoading = true;
   try {
-    const res     = await fetch('/api/threads');
+    const params = new URLSearchParams({ limit: THREAD_PAGE_SIZE });
+    if (!reset) params.set('cursor', threadCursor);
+    const res = await fetch(`/api/threads?${params}`);
     if (res.status === 401) return; // not logged in yet
     const data    = await res.json();
     const threads = data.threads || [];
 
-    threadListEl.innerHTML = '';
+    if (reset) threadListEl.innerHTML = '';
+    threadCursor = data.next_cursor || null;
 
-    if (threads.length === 0) {
+    if (reset && threads.length === 0) {
       threadListEl.innerHTML = '<p class="thread-empty">No conversations yet</p>';
       return;
     }
-
-    threads.forEach(thread => {
-      const item = document.createElement('div');
-      item.className = 'thread-item';
-      item.dataset.id = thread.id;
-      if (thread.id === currentThreadId) item.classList.add('active');
-
-      const title = document.createElement('span');
-      title.className = 'thread-title';
-      title.textContent = thread.title;
-
-      const deleteBtn = document.createElement('button');
-      deleteBtn.className = 'thread-delete';
-      deleteBtn.title = 'Delete this conversation';
-      deleteBtn.textContent = '×';
-      deleteBtn.addEventListener('click', async (e) => {
-        e.stopPropagation();
-        await deleteThread(thread.id);
-      });
-
-      item.appendChild(title);
-      item.appendChild(deleteBtn);
-      item.addEventListener('click', () => { loadThread(thread.id); if (window.innerWidth <= 768) closeSidebar(); });
-      threadListEl.appendChild(item);
-    });
+    threads.forEach(thread => threadListEl.appendChild(threadItem(thread)));
   } catch (err) {
     console.error('Failed to load threads:', err);
+  } finally {
+    threadsLoading = false;
+  }
+  // Keep paging until the list can scroll, otherwise the scroll handler never fires
+  if (threadCursor && threadListEl.scrollHeight <= threadListEl.clientHeight) {
+    await loadMoreThreads();
+  }
+}
+
+threadListEl.addEventListener('scroll', () => {
+  if (threadListEl.scrollTop + threadListEl.clientHeight >= threadListEl.scrollHeight - 200) {
+    loadMoreThreads();
+  }
+});
+
+function threadItem(thread) {
+  const item = document.createElement('div');
+  item.className = 'thread-item';
+  item.dataset.id = thread.id;
+  if (thread.id === currentThreadId) item.classList.add('active');
+
+  const title = document.createElement('span');
+  title.className = 'thread-title';
+  title.textContent = thread.title;
+
+  const deleteBtn = document.createElement('button');
+  deleteBtn.className = 'thread-delete';
+  deleteBtn.title = 'Delete this conversation';
+  deleteBtn.textContent = '×';
+  deleteBtn.addEventListener('click', async (e) => {
+    e.stopPropagation();
+    await deleteThread(thread.id);
+  });
+
+  item.appendChild(title);
+  item.appendChild(deleteBtn);
+  item.addEventListener('click', () => { loadThread(thread.id); if (window.innerWidth <= 768) closeSidebar(); });
+  return item;
+}
+
+// Move a just-updated thread to the top of the sidebar without refetching the list
+function bumpThread(thread) {
+  if (searchQuery) return;   // the sidebar is showing search results
+  threadListEl.querySelector('.thread-empty')?.remove();
+  threadListEl.querySelector(`.thread-item[data-id="${thread.id}"]`)?.remove();
+  threadListEl.prepend(threadItem(thread));
+}
+
+// ── Search ──
+let searchQuery = '';
+let searchTimer = null;
+
+threadSearchEl.addEventListener('input', () => {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(() => runSearch(threadSearchEl.value.trim()), 250);
+});
+
+async function runSearch(query) {
+  searchQuery = query;
+  if (query.length < 2) {
+    searchQuery = '';
+    await loadThreads();
+    return;
+  }
+  try {
+    const res  = await fetch(`/api/search?${new URLSearchParams({ q: query })}`);
+    const data = await res.json();
+    if (query !== searchQuery) return;   // a newer search has started
+
+    threadCursor = null;   // no infinite scroll while showing results
+    threadListEl.innerHTML = '';
+    (data.threads || []).forEach(thread => threadListEl.appendChild(threadItem(thread)));
+    (data.results || []).forEach(hit => threadListEl.appendChild(searchResultItem(hit)));
+    if (!threadListEl.children.length) {
+      threadListEl.innerHTML = '<p class="thread-empty">No matches</p>';
+    }
+  } catch (err) {
+    console.error('Search failed:', err);
   }
 }
 
+function searchResultItem(hit) {
+  const item = document.createElement('div');
+  item.className = 'thread-item search-result';
+  item.dataset.id = hit.thread_id;
+  if (hit.thread_id === currentThreadId) item.classList.add('active');
+
+  const title = document.createElement('span');
+  title.className = 'thread-title';
+  title.textContent = hit.thread_title;
+
+  // Snippets mark matches with \u0002…\u0003; escape first, then highlight
+  const snippet = document.createElement('div');
+  snippet.className = 'search-snippet';
+  const escaped = document.createElement('span');
+  escaped.textContent = hit.snippet || '';
+  snippet.innerHTML = escaped.innerHTML.replace(/\u0002/g, '<mark>').replace(/\u0003/g, '</mark>');
+
+  item.appendChild(title);
+  item.appendChild(snippet);
+  item.addEventListener('click', () => { loadThread(hit.thread_id); if (window.innerWidth <= 768) closeSidebar(); });
+  return item;
+}
+
+// ── Thread Messages ──
+const MESSAGE_PAGE_SIZE = 30;
+let messagesBefore  = null;    // cursor for the next older page of the open thread; null at the start
+let messagesLoading = false;
+
 async function loadThread(threadId) {
   try {
-    const res  = await fetch(`/api/threads/${threadId}`);
+    const res  = await fetch(`/api/threads/${threadId}/messages?limit=${MESSAGE_PAGE_SIZE}`);
     const data = await res.json();
     const t    = data.thread;
 
     currentThreadId = threadId;
+    messagesBefore  = data.before || null;
     threadTitleEl.textContent = t.title;
 
     messagesEl.innerHTML = '';
     welcomeEl.style.display = 'none';
 
-    t.messages.forEach(m => addMessage(m.role, m.content, m.mode));
+    data.messages.forEach(m => addMessage(m.role, withAttachmentNames(m), m.mode));
     updateActiveThread(threadId);
     scrollToBottom();
 
     // Restore career progress bar if this is a career thread
     if (t.mode === 'career') {
       setActiveMode('career');
-      const userMsgCount = t.messages.filter(m => m.role === 'user').length;
-      careerQuestionNumber = Math.min(userMsgCount, 8);
+      careerQuestionNumber = data.question_number || 0;
       updateCareerProgress(careerQuestionNumber);
       showCareerProgress(true);
     } else {
@@ -652,13 +877,47 @@ async function loadThread(threadId) {
   }
 }
 
+// Prepend the next older page, keeping the messages the user is looking at in place
+async function loadOlderMessages() {
+  if (messagesLoading || !messagesBefore || !currentThreadId) return;
+  messagesLoading = true;
+  const threadId = currentThreadId;
+  try {
+    const params = new URLSearchParams({ limit: MESSAGE_PAGE_SIZE, before: messagesBefore });
+    const res    = await fetch(`/api/threads/${threadId}/messages?${params}`);
+    const data   = await res.json();
+    if (threadId !== currentThreadId) return;   // switched threads while loading
+
+    const fragment = document.createDocumentFragment();
+    data.messages.forEach(m => fragment.appendChild(buildMessage(m.role, withAttachmentNames(m), m.mode).msg));
+    const fromBottom = messagesEl.scrollHeight - messagesEl.scrollTop;
+    messagesEl.insertBefore(fragment, messagesEl.firstChild);
+    messagesEl.scrollTop = messagesEl.scrollHeight - fromBottom;
+    messagesBefore = data.before || null;
+  } catch (err) {
+    console.error('Failed to load older messages:', err);
+  } finally {
+    messagesLoading = false;
+  }
+}
+
+messagesEl.addEventListener('scroll', () => {
+  if (messagesEl.scrollTop < 200) loadOlderMessages();
+});
+
+function withAttachmentNames(m) {
+  const names = (m.attachments || []).map(a => a.filename);
+  return m.content + (names.length ? `\n\n📎 ${names.join(', ')}` : '');
+}
+
 async function deleteThread(threadId) {
   try {
     await fetch(`/api/threads/${threadId}`, { method: 'DELETE' });
     if (threadId === currentThreadId) {
       startNewConversation();
     }
-    await loadThreads();
+    threadListEl.querySelector(`.thread-item[data-id="${threadId}"]`)?.remove();
+    if (!threadListEl.querySelector('.thread-item')) await loadThreads();
   } catch (err) {
     console.error('Failed to delete thread:', err);
   }
@@ -743,7 +1002,7 @@ async function startCareerJourney() {
 
       // Update thread list and title
       threadTitleEl.textContent = data.thread.title;
-      loadThreads();
+      bumpThread(data.thread);
       updateActiveThread(data.thread.id);
     } else {
       addMessage('assistant', `⚠️ Error: ${data.error || 'Failed to start career session. Please try again.'}`, 'career');
@@ -0,0 +1,100 @@
+"""
+Debugging SMTP server
+---------------------
+A local SMTP sink that prints every message it receives instead of delivering it, for
+running the email sender without a real mail account. Connections are kept open across
+messages, so you can see the sender reusing one session.
+
+    python tools/debug_smtp.py [--port 1025] [--fail-rate 0.2]
+
+Then run the app against it (no credentials, so no login or STARTTLS):
+
+    SMTP_SERVER=127.0.0.1 SMTP_PORT=1025 python app.py
+
+--fail-rate answers that share of messages with a temporary 451 error to exercise the
+sender's retry/backoff.
+"""
+
+import argparse
+import random
+import socketserver
+from email import message_from_bytes, policy
+
+
+class SmtpSink(socketserver.StreamRequestHandler):
+    fail_rate = 0.0
+    sessions  = 0
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        SmtpSink.sessions += 1
+        session, count = SmtpSink.sessions, 0
+        print(f"── session {session} opened from {self.client_address[0]}")
+        self.reply('220 debug-smtp ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command = line.decode(errors='replace').strip()
+            verb    = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 debug-smtp')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b'.\n', b''):
+                        break
+                    data += chunk[1:] if chunk.startswith(b'..') else chunk
+                if random.random() < self.fail_rate:
+                    self.reply('451 Temporary failure (simulated)')
+                    continue
+                count += 1
+                msg = message_from_bytes(data, policy=policy.default)
+                print(f"── session {session} message {count}: {sender} → {', '.join(recipients)}")
+                print(f"   Subject: {msg['Subject']}")
+                body = msg.get_body(preferencelist=('plain', 'html'))
+                print('   ' + (body.get_content() if body else '').strip().replace('\n', '\n   '))
+                self.reply('250 OK: queued')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                self.reply('502 Command not implemented')
+        print(f"── session {session} closed after {count} message(s)")
+
+
+class ThreadingSmtpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads      = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of messages answered with 451')
+    args = parser.parse_args()
+
+    SmtpSink.fail_rate = args.fail_rate
+    with ThreadingSmtpServer(('127.0.0.1', args.port), SmtpSink) as server:
+        print(f"Debug SMTP listening on 127.0.0.1:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
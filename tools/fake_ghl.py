@@ -0,0 +1,105 @@
+"""
+Fake GoHighLevel API
+--------------------
+A local stand-in for the three GHL endpoints the app calls (contact search, contact
+create, add tags), so signup and Stripe webhook flows — and the GHL outbox's retry and
+dead-letter handling — can be exercised without touching the real CRM.
+
+    python tools/fake_ghl.py [--port 8765] [--latency 0.2] [--fail-rate 0.3]
+
+Then run the app against it:
+
+    GHL_BASE_URL=http://127.0.0.1:8765 GHL_API_KEY=fake python app.py
+
+--fail-rate makes that share of requests return 503, and --latency adds a delay to every
+response. GET /_state dumps the contacts and tags recorded so far.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+contacts = {}   # id -> contact dict (with a 'tags' list)
+lock     = threading.Lock()
+
+
+class FakeGhlHandler(BaseHTTPRequestHandler):
+    latency   = 0.0
+    fail_rate = 0.0
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _simulate(self):
+        """Apply the configured latency; returns True if this request should fail."""
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self._send(503, {'message': 'fake outage'})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/_state':
+            with lock:
+                return self._send(200, {'contacts': list(contacts.values())})
+        if self._simulate():
+            return
+        if url.path == '/contacts/search':
+            query = (parse_qs(url.query).get('query') or [''])[0].lower()
+            with lock:
+                found = [c for c in contacts.values() if query in c['email'].lower()]
+            return self._send(200, {'contacts': found})
+        self._send(404, {'message': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if self._simulate():
+            return
+        body = self._body()
+        parts = url.path.strip('/').split('/')
+        if parts == ['contacts']:
+            contact = {**body, 'id': uuid.uuid4().hex[:20], 'tags': []}
+            with lock:
+                contacts[contact['id']] = contact
+            return self._send(201, {'contact': contact})
+        if len(parts) == 3 and parts[0] == 'contacts' and parts[2] == 'tags':
+            with lock:
+                contact = contacts.get(parts[1])
+                if not contact:
+                    return self._send(400, {'message': 'unknown contact'})
+                contact['tags'] = sorted(set(contact['tags']) | set(body.get('tags', [])))
+            return self._send(201, {'tags': contact['tags']})
+        self._send(404, {'message': 'not found'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of requests answered with 503')
+    args = parser.parse_args()
+
+    FakeGhlHandler.latency   = args.latency
+    FakeGhlHandler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), FakeGhlHandler)
+    print(f"Fake GHL listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()